@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import Agents
+
+# Finished tasks kept for GET /tasks/<id> before the oldest are forgotten
+MAX_FINISHED_TASKS = 1000
+
+
+class AgentService():
+    """
+    Keeps one warm agent process: config, embedding models, FAISS indexes and JSON corpora are loaded once
+    and reused by every task, instead of paying that start-up on each `python Agents.py`.
+    Tasks are queued and run by a fixed number of worker threads. Each task gets its own working directory
+    for the TEMP_* files the tools pass between each other; pytest runs are serialized in Agents.
+    """
+    def __init__(self, workers=2, max_queue=100, keep_task_dirs=False):
+        self.workers = workers
+        self.keep_task_dirs = keep_task_dirs
+        self.tasks = {}
+        self.tasks_lock = threading.Lock()
+        self.task_queue = queue.Queue(maxsize=max_queue)
+        self.work_dir = tempfile.mkdtemp(prefix='agent_service_')
+        self.agent = None
+        self._threads = []
+
+    def start(self):
+        start_time = time.perf_counter()
+        self.agent = Agents.setup_agent()
+        Agents.load_resources()
+        print(f"[INFO] Agent service ready in {time.perf_counter() - start_time:.1f}s, {self.workers} worker(s)")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"agent-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, task_input):
+        """Queue a task; raises queue.Full when max_queue tasks are already waiting."""
+        task = {
+            "task_id": uuid.uuid4().hex,
+            "status": "queued",
+            "input": task_input,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self.tasks_lock:
+            self.tasks[task["task_id"]] = task
+        try:
+            self.task_queue.put_nowait(task["task_id"])
+        except queue.Full:
+            with self.tasks_lock:
+                del self.tasks[task["task_id"]]
+            raise
+        return self.get_task(task["task_id"])
+
+    def get_task(self, task_id):
+        with self.tasks_lock:
+            task = self.tasks.get(task_id)
+            return dict(task) if task else None
+
+    def list_tasks(self):
+        with self.tasks_lock:
+            return [{key: task[key] for key in ("task_id", "status", "created_at", "finished_at")} for task in self.tasks.values()]
+
+    def _update_task(self, task_id, **fields):
+        with self.tasks_lock:
+            self.tasks[task_id].update(fields)
+
+    def _forget_finished_tasks(self):
+        with self.tasks_lock:
+            finished = [task for task in self.tasks.values() if task["finished_at"] is not None]
+            finished.sort(key=lambda task: task["finished_at"])
+            for task in finished[:max(len(finished) - MAX_FINISHED_TASKS, 0)]:
+                del self.tasks[task["task_id"]]
+
+    def _worker(self):
+        while True:
+            task_id = self.task_queue.get()
+            try:
+                self._run_task(task_id)
+            finally:
+                self.task_queue.task_done()
+
+    def _run_task(self, task_id):
+        task_input = self.get_task(task_id)["input"]
+        task_dir = os.path.join(self.work_dir, task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        self._update_task(task_id, status="running", started_at=time.time())
+        print(f"[INFO] Task {task_id} started")
+        try:
+            with Agents.task_workspace(task_dir):
+                result = self.agent.run(task_input)
+            self._update_task(task_id, status="done", result=result, finished_at=time.time())
+            print(f"✅ Task {task_id} done")
+        except Exception as e:
+            traceback.print_exc()
+            self._update_task(task_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            print(f"❌ Task {task_id} failed: {e}")
+        finally:
+            if not self.keep_task_dirs:
+                shutil.rmtree(task_dir, ignore_errors=True)
+            self._forget_finished_tasks()
+
+    def health(self):
+        with self.tasks_lock:
+            statuses = [task["status"] for task in self.tasks.values()]
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+        }
+
+
+def _parse_task_input(body):
+    """
+    Either {"input": "<full agent instructions>"} or
+    {"current_status": [...], "desired_goal": [...], "test_name": "..."} for the standard generate -> run -> triage task.
+    """
+    if isinstance(body.get("input"), str) and body["input"].strip():
+        return body["input"]
+    if isinstance(body.get("current_status"), list) and isinstance(body.get("desired_goal"), list) and body.get("test_name"):
+        return Agents.build_task_input(body["current_status"], body["desired_goal"], body["test_name"])
+    raise ValueError("Expected 'input', or 'current_status', 'desired_goal' and 'test_name'")
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /tasks        queue a task, returns {"task_id", "status"} with 202
+    GET  /tasks        list tasks
+    GET  /tasks/<id>   status, and the agent's answer once done
+    GET  /health       worker and queue counts
+    """
+    service = None
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            return self._send_json(200, self.service.health())
+        if path == '/tasks':
+            return self._send_json(200, self.service.list_tasks())
+        if path.startswith('/tasks/'):
+            task = self.service.get_task(path[len('/tasks/'):])
+            if task is None:
+                return self._send_json(404, {"error": "Unknown task"})
+            return self._send_json(200, task)
+        self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/tasks':
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Expected a JSON object")
+            task_input = _parse_task_input(body)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+
+        try:
+            task = self.service.submit(task_input)
+        except queue.Full:
+            return self._send_json(503, {"error": "Task queue is full, retry later"})
+        self._send_json(202, {"task_id": task["task_id"], "status": task["status"]})
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {self.address_string()} {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the testing agent over HTTP with its models and indexes kept in memory.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="tasks run at the same time")
+    parser.add_argument("--max-queue", type=int, default=100, help="tasks waiting before new ones are refused")
+    parser.add_argument("--keep-task-dirs", action="store_true", help="keep each task's TEMP_* files for debugging")
+    args = parser.parse_args()
+
+    service = AgentService(workers=args.workers, max_queue=args.max_queue, keep_task_dirs=args.keep_task_dirs)
+    service.start()
+
+    AgentRequestHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), AgentRequestHandler)
+    print(f"[INFO] Agent service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not args.keep_task_dirs:
+            shutil.rmtree(service.work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import os
+import sys
+import glob
+import shutil
+import threading
+import contextvars
 import subprocess
 import configparser
-import pytest
 import ast
 import json
+from contextlib import contextmanager
 
 # from langchain.agents import tool, initialize_agent, AgentType
 
@@ -21,9 +26,12 @@ from TestCasePageFunctionExtractor.Extractor import TestCase_PageFunction_Extrac
 from PageFunctionMapper.PageFunctionMapper import SearchPageFunctions
 from TestStepGenerator.TestStepGenerator import TestStepGenerator
 from TestCodeGenerator.TestCodeGenerator import GenerateCase
-from FailLogCollector.FailLogCollector import FailLogCollector
+from FailLogCollector.FailLogCollector import FailLogCollector, ShardedFailLogCollector
 from ErrorAnalyzer.Analyzer_v2 import ErrorAnalyzer
 from CaseRefactor.CaseRefactor import CaseRefactor
+from _BasicTool.ModelRegistry import warm_up
+from _BasicTool.Searcher import load_searcher
+from _BasicTool.TestCaseRepository import load_test_case_repository
 
 CONFIG_FILE = 'app.config'
 
@@ -73,6 +81,36 @@ def read_config():
     # API Key
     API_KEY = config.get('General', 'API_KEY')
 
+# Working directory of the task running in this context (set by AgentService); the TEMP_* files go there
+_task_dir = contextvars.ContextVar('agent_task_dir', default=None)
+# The tests drive a single app, so pytest runs are serialized across tasks
+_pytest_lock = threading.Lock()
+# Extraction rewrites the shared JSON files
+_extract_lock = threading.Lock()
+
+@contextmanager
+def task_workspace(task_dir):
+    """Route the TEMP_* files of the tools run inside this block to task_dir, so concurrent tasks do not overwrite each other."""
+    token = _task_dir.set(task_dir)
+    try:
+        yield task_dir
+    finally:
+        _task_dir.reset(token)
+
+def _temp_path(path):
+    """path itself, or the file of the same name in the current task's directory."""
+    task_dir = _task_dir.get()
+    if task_dir is None:
+        return path
+    return os.path.join(task_dir, os.path.basename(path))
+
+def _pool_workers():
+    """
+    max_workers for the tools' process pools: one per CPU, but serial inside an AgentService task, where
+    forking from a threaded process that has torch and FAISS loaded can deadlock the child.
+    """
+    return None if _task_dir.get() is None else 1
+
 def _save_to_json(data, file):
     """Save data to a JSON file."""
     with open(file, 'w') as f:
@@ -99,8 +137,9 @@ def extract_test_case_code_page_function_to_json_func(input_str: str) -> str:
         'test_case_json': TEST_CASE_JSON_PATH,
     }
     extract_obj = TestCase_PageFunction_Extractor(path_settings=path_settings)
-    extract_obj.extract_process('test_case')
-    extract_obj.extract_process('page_function')
+    with _extract_lock:
+        extract_obj.extract_process('test_case', max_workers=_pool_workers())
+        extract_obj.extract_process('page_function', max_workers=_pool_workers())
     return True
 
 @tool(
@@ -127,10 +166,11 @@ def gen_test_steps_func(input_str: str) -> str:
     current_status = ast.literal_eval(list_strs[0])
     desired_goal = ast.literal_eval(list_strs[1])
 
-    generator = TestStepGenerator(TEST_CASE_JSON_PATH, PAGE_FUNCTIONS_JSON_PATH, SAVE_FULL_HELP_JSON_FILE_NAME, current_status, desired_goal)
+    generator = TestStepGenerator(TEST_CASE_JSON_PATH, PAGE_FUNCTIONS_JSON_PATH, SAVE_FULL_HELP_JSON_FILE_NAME, current_status, desired_goal,
+                                  test_case_faiss_path=TEST_CASE_FAISS_PATH)
     generated_steps = generator.generate_process()
 
-    _save_to_json(generated_steps, TEMP_GENERATED_TEST_STEPS)
+    _save_to_json(generated_steps, _temp_path(TEMP_GENERATED_TEST_STEPS))
     print(f'Generated test steps:\n{generated_steps}')
     return True
 
@@ -159,12 +199,11 @@ def search_relevant_functions_step_by_step_func(test_steps: str) -> list:
         'page_functions_filtered_json': PAGE_FUNCTIONS_FILTERED_JSON_PATH,
     }
     relevant_page_functions = []
-    search = SearchPageFunctions(path_settings['page_functions_json'], path_settings['page_functions_faiss'], path_settings['page_functions_filtered_json'])
+    search = load_searcher(SearchPageFunctions, path_settings['page_functions_json'], path_settings['page_functions_faiss'], path_settings['page_functions_filtered_json'])
     
-    test_steps = _read_from_json(TEMP_GENERATED_TEST_STEPS)
+    test_steps = _read_from_json(_temp_path(TEMP_GENERATED_TEST_STEPS))
     print(f'Get the test_steps from json file:\n{test_steps}')
-    for step in test_steps.split("\n"):
-        relevant_functions = search.extract_relevant_functions_step_by_step(step)
+    for relevant_functions in search.extract_relevant_functions_for_steps(test_steps):
         if not relevant_functions:
             # call generate page function tool
             continue
@@ -175,7 +214,7 @@ def search_relevant_functions_step_by_step_func(test_steps: str) -> list:
                     relevant_page_functions.append(func)
 
     # return relevant_page_functions
-    _save_to_json(relevant_page_functions, TEMP_EXTRACTED_PAGE_FUNCTION)
+    _save_to_json(relevant_page_functions, _temp_path(TEMP_EXTRACTED_PAGE_FUNCTION))
     return True
 
 
@@ -195,10 +234,10 @@ def gen_test_case_code_func(test_case_name: str) -> str:
     return:
         str: Generate test case successfully or not.
     """
-    test_steps = _read_from_json(TEMP_GENERATED_TEST_STEPS)
+    test_steps = _read_from_json(_temp_path(TEMP_GENERATED_TEST_STEPS))
     print(f'Get the test_steps from json file:\n{test_steps}')
 
-    relevant_functions = _read_from_json(TEMP_EXTRACTED_PAGE_FUNCTION)
+    relevant_functions = _read_from_json(_temp_path(TEMP_EXTRACTED_PAGE_FUNCTION))
     print(f'Get the relevant functions from json file:\n{relevant_functions}')
     path_settings = {
         'test_case_dir': TEST_CASE_PATH,
@@ -249,8 +288,13 @@ def run_pytest_func(test_case_name: str = None) -> bool:
             # You can add other flags here based on your needs
         ]
 
-        # Run pytest with the constructed test path and any additional arguments
-        result = pytest.main([test_path] + additional_args)
+        # Run pytest in a child process: in-process pytest.main would reuse the test module imported by an
+        # earlier run, missing tests generated (or edited) since then in a long-lived AgentService
+        with _pytest_lock:
+            result = subprocess.run([sys.executable, "-m", "pytest", test_path, *additional_args]).returncode
+            # Keep this run's log for the task, the next run overwrites PYTEST_LOG_PATH
+            if _task_dir.get() is not None and not glob.has_magic(PYTEST_LOG_PATH) and os.path.exists(PYTEST_LOG_PATH):
+                shutil.copyfile(PYTEST_LOG_PATH, _temp_path(PYTEST_LOG_PATH))
 
         # Check if pytest ran successfully
         if result == 0:
@@ -282,12 +326,22 @@ def get_fail_cases_func(input_str: str = None) -> list:
     return:
         list: A list contains the failed test cases, log.
     """
-    collector = FailLogCollector(path_setting={
-        "log_path": PYTEST_LOG_PATH,
-        "json_path": PYTEST_LOG_JSON_PATH
-    })
-    fail_cases = collector.collect_process()
-    _save_to_json(fail_cases, TEMP_FAIL_CASES)
+    log_json_path = _temp_path(PYTEST_LOG_JSON_PATH)
+    if glob.has_magic(PYTEST_LOG_PATH):
+        # Sharded run: one pytest.log per worker, parsed in parallel and merged by test name
+        collector = ShardedFailLogCollector(PYTEST_LOG_PATH, json_path=log_json_path, max_workers=_pool_workers())
+    else:
+        # The task's own copy of the log if it ran pytest, else the shared one
+        log_path = _temp_path(PYTEST_LOG_PATH)
+        if not os.path.exists(log_path):
+            log_path = PYTEST_LOG_PATH
+        collector = FailLogCollector(path_setting={
+            "log_path": log_path,
+            "json_path": log_json_path
+        })
+    # ErrorAnalyzer reads the failing test logs back from this JSON
+    fail_cases = collector.collect_process(save_json=True)
+    _save_to_json(fail_cases, _temp_path(TEMP_FAIL_CASES))
     return fail_cases
 
 
@@ -312,7 +366,7 @@ def analysis_error_func(input_str: str) -> str:
     """
     path_settings = {
         'test_case_json': TEST_CASE_JSON_PATH,
-        'pytest_log_json_path': PYTEST_LOG_JSON_PATH,
+        'pytest_log_json_path': _temp_path(PYTEST_LOG_JSON_PATH),
     }
 
     fail_case, flow_changed_func = input_str.split(';')
@@ -320,15 +374,65 @@ def analysis_error_func(input_str: str) -> str:
     error_analyzer = ErrorAnalyzer(flow_changed_func, path_settings)
 
     error_reason = error_analyzer.analysis_process(fail_case)
-    _save_to_json(error_reason, TEMP_ERROR_REASON_ANALYSIS)
+    _save_to_json(error_reason, _temp_path(TEMP_ERROR_REASON_ANALYSIS))
 
     return error_reason["error_type"] + error_reason["error_condition"]
 
 
+@tool(
+    name_or_callable="AnalyzeAllErrorsTool",
+    description=(
+        "Analyze all failed test cases collected by GetFailCasesTool in one batch to determine AP/AT error and the failure reason of each."
+        "Input: flow_changed_func (string) the function that the flow changed, or 'None'."
+        "Output: One line per failed test case: 'test_name: error type error condition'."
+    )
+)
+def analysis_all_errors_func(flow_changed_func: str = None) -> str:
+    """
+    Analyze all failed test cases at once with concurrent LLM calls.
+    args:
+        flow_changed_func: str: The function that the flow changed.
+    return:
+        str: The error type and condition for each failed test case
+    """
+    path_settings = {
+        'test_case_json': TEST_CASE_JSON_PATH,
+    }
+
+    fail_cases = _read_from_json(_temp_path(TEMP_FAIL_CASES))
+    error_analyzer = ErrorAnalyzer(flow_changed_func, path_settings)
+    report = error_analyzer.batch_analysis_process(fail_cases, report_path=_temp_path(TEMP_ERROR_REASON_ANALYSIS))
+
+    return "\n".join(
+        f"{item['test_name']}: {item['error_type']} {item['error_condition']}" if 'error' not in item
+        else f"{item['test_name']}: analysis failed ({item['error']})"
+        for item in report
+    )
+
+
+def load_resources():
+    """
+    Load the FAISS indexes and JSON corpora the tools search, so they stay resident in this process
+    (shared through load_searcher / load_test_case_repository) instead of being read on every tool call.
+    """
+    try:
+        load_searcher(SearchPageFunctions, PAGE_FUNCTIONS_JSON_PATH, PAGE_FUNCTIONS_FAISS_PATH, PAGE_FUNCTIONS_FILTERED_JSON_PATH)
+        # Builds the help, page function description and test case searchers the step generator uses
+        TestStepGenerator(TEST_CASE_JSON_PATH, PAGE_FUNCTIONS_JSON_PATH, SAVE_FULL_HELP_JSON_FILE_NAME, [], [],
+                          test_case_faiss_path=TEST_CASE_FAISS_PATH)
+        load_test_case_repository(TEST_CASE_JSON_PATH)
+    except (OSError, ValueError) as e:
+        # e.g. nothing extracted yet; the tools load what they need on first use
+        print(f"[WARN] Could not preload search indexes: {e}")
+
+
 def setup_agent():
     """Setup and return the LangChain agent with all tools."""
     # Read configuration first
     read_config()
+
+    # Load the embedding models once up front; every tool shares them afterwards
+    warm_up(['all-MiniLM-L6-v2', 'paraphrase-MiniLM-L6-v2'])
     
     # Create system prompt
     system_prompt = """
@@ -364,6 +468,7 @@ def setup_agent():
         run_pytest_func,
         get_fail_cases_func,
         analysis_error_func,
+        analysis_all_errors_func,
     ]
 
     # Initialize agent (ensure you pass the correct agent type)
@@ -376,16 +481,9 @@ def setup_agent():
     return agent
 
 
-def main():
-    """Main execution function for the testing agent."""
-    # Initialize the agent
-    agent = setup_agent()
-
-    current_status = ['APP is not launched']
-    desired_goal = ['Enter Room (Title)']
-    test_name = 'test_afdsafdsg_room_func_100_1'
-
-    user_input = f"""Please follw the steps to complete the assigned task:
+def build_task_input(current_status, desired_goal, test_name):
+    """The generate -> run -> triage instructions given to the agent for one test."""
+    return f"""Please follw the steps to complete the assigned task:
 1. Extract test case code and page function from the given directory.
 2. Generate test step from current status {current_status} to desired goal {desired_goal}.
 3. After generated test steps and found the relevant page functions, generate test code with test name '{test_name}'.
@@ -405,6 +503,17 @@ def main():
 """
 
 
+def main():
+    """Main execution function for the testing agent."""
+    # Initialize the agent
+    agent = setup_agent()
+
+    current_status = ['APP is not launched']
+    desired_goal = ['Enter Room (Title)']
+    test_name = 'test_afdsafdsg_room_func_100_1'
+
+    user_input = build_task_input(current_status, desired_goal, test_name)
+
     # Run the agent
     response = agent.run(user_input)
     print("\n[Agent Response]\n")
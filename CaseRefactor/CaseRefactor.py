@@ -1,5 +1,8 @@
 import os
-import json
+import sys
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+from _BasicTool.TestCaseRepository import load_test_case_repository
 
 class CaseRefactor:
     def __init__(self, test_name: str, error_reason: str, path_settings: dict) -> str:
@@ -10,11 +13,7 @@ class CaseRefactor:
         self.test_code = self._get_case_content()
 
     def _get_case_content(self):
-        with open(self.test_case_json, 'r', encoding='utf-8') as f:
-            test_cases = json.load(f)
-
-        # Replace 'test_launch_process_1_1' with the name of your desired test case
-        test_case = next((tc for tc in test_cases if tc['name'] == self.test_name), None)
+        test_case = load_test_case_repository(self.test_case_json).get(self.test_name)
 
         if test_case:
             return test_case['full_code']
@@ -2,41 +2,59 @@ import sys
 import os
 import json
 import re
+import io
+import hashlib
+import zipfile
+import numpy as np
 parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_path)
 
 from _ChatAPIConnector.ChatAPIConnector import ChatAPIConnector
 from _Database.fail_reason import fail_reasons
+from _BasicTool.ModelRegistry import get_model
+from _BasicTool.TestCaseRepository import load_test_case_repository, TestLogRepository
+from _BasicTool.JsonJournal import atomic_write
 
-from sentence_transformers import SentenceTransformer, util
+ERROR_TYPES = ["AP Fail", "AT Fail"]
+DEFAULT_TAXONOMY_EMBEDDINGS_PATH = os.path.join(parent_path, "_Database", "fail_reason_embeddings.npz")
 
 class ErrorAnalyzer:
     def __init__(self, flow_changed_func, path_settings):
         self.flow_changed_func = flow_changed_func
         self.fail_reasons = fail_reasons
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.model_name = 'all-MiniLM-L6-v2'
+        self.model = get_model(self.model_name)
+        self.taxonomy_embeddings_path = path_settings.get('fail_reason_embeddings', DEFAULT_TAXONOMY_EMBEDDINGS_PATH)
+        self._taxonomy_embeddings = None  # (taxonomy_key, embeddings) of the last load, reused by every batch
         self.chat_api_connector = ChatAPIConnector()
-        with open(path_settings['test_case_json'], "r", encoding="utf-8") as f:
-            self.test_code_json_content = json.load(f)
-
-        with open(path_settings['pytest_log_json_path'], "r", encoding="utf-8") as f:
-            self.test_log_json_content = json.load(f)
-
-    def _get_error_screen_shot(self):
-        for line in self.fail_case_content_dict["test_log"]:
+        self.test_case_repository = load_test_case_repository(path_settings['test_case_json'])
+
+        # Batch triage gets the logs straight from FailLogCollector, so the log JSON is optional
+        test_log_json_content = []
+        if path_settings.get('pytest_log_json_path'):
+            with open(path_settings['pytest_log_json_path'], "r", encoding="utf-8") as f:
+                test_log_json_content = json.load(f)
+        self.test_log_repository = TestLogRepository(test_log_json_content)
+
+    def _get_error_screen_shot(self, fail_case_content_dict=None):
+        if fail_case_content_dict is None:
+            fail_case_content_dict = self.fail_case_content_dict
+        for line in fail_case_content_dict["test_log"]:
             if "Exception screenshot:" in line:
                 match = re.search(r'Exception screenshot:(.*)', line)
                 if match:
                     return match.group(1).strip()
 
-    def _get_fail_case_test_code(self):
-        for test_case_content in self.test_code_json_content:
-            if test_case_content["name"] == self.fail_case_content_dict["test_name"]:
-                return test_case_content["full_code"]
+    def _get_fail_case_test_code(self, fail_case_content_dict=None):
+        if fail_case_content_dict is None:
+            fail_case_content_dict = self.fail_case_content_dict
+        return self.test_case_repository.get_full_code(fail_case_content_dict["test_name"])
 
-    def _generate_prompt(self):
+    def _generate_prompt(self, fail_case_content_dict=None):
         """根據失敗測試案例生成詳細的 prompt。""" # 將多行 log 組合成一個字串（可根據需求進行格式調整） 
-        error_log = "\n".join(self.fail_case_content_dict.get("test_log", [])) 
+        if fail_case_content_dict is None:
+            fail_case_content_dict = self.fail_case_content_dict
+        error_log = "\n".join(fail_case_content_dict.get("test_log", [])) 
         fail_str = ''
         for key, value in self.fail_reasons.items():
             fail_str += f" - Error Message: [{key}]:\n"
@@ -44,7 +62,7 @@ class ErrorAnalyzer:
                 for sub_sub_key, sub_sub_value in sub_value.items():
                     fail_str += f"    o [{sub_key}][{sub_sub_key}]  {sub_sub_value}\n"
                
-        fail_test_code = self._get_fail_case_test_code()
+        fail_test_code = self._get_fail_case_test_code(fail_case_content_dict)
 
         prompt = f'''
 Analyze the provided error log, screenshot, and test case code to identify the single most likely error reason for the auto testing failure.
@@ -84,55 +102,87 @@ Instruction:
 '''
         return prompt
 
+    def _get_system_role_msg(self):
+        return "You are an expert in analyzing auto testing failures. Your task is to examine error logs, test case code, and screenshots to determine the single most likely cause of failure. Categorize the error as either an AP Fail (application issue) or an AT Fail (automation script issue). Provide a concrete fix based on your analysis."
+
     def _ask_llm(self, prompt, image_path=None):
-        system_role_msg = "You are an expert in analyzing auto testing failures. Your task is to examine error logs, test case code, and screenshots to determine the single most likely cause of failure. Categorize the error as either an AP Fail (application issue) or an AT Fail (automation script issue). Provide a concrete fix based on your analysis."
-        return self.chat_api_connector.generate_chat_response(prompt, system_role_msg, image_path=image_path)
+        return self.chat_api_connector.generate_chat_response(prompt, self._get_system_role_msg(), image_path=image_path)
 
     def _get_fail_conditions(self):
-        # Using set comprehension to avoid duplicates:
-        unique_subkeys = {sub_key 
-                        for outer in self.fail_reasons.values() 
-                        for inner in outer.values() 
-                        for sub_key in inner}
-
-        # Convert the set to a list:
-        unique_subkeys_list = list(unique_subkeys)
+        # Unique sub keys in the order they appear in fail_reason.py, so the taxonomy is stable between runs
+        unique_subkeys_list = list(dict.fromkeys(
+            sub_key
+            for outer in self.fail_reasons.values()
+            for inner in outer.values()
+            for sub_key in inner
+        ))
         return unique_subkeys_list
-    
-    def _reorganize_error_reason(self, error_reason):
-        error_types = ["AP Fail", "AT Fail"]
 
+    def _get_taxonomy_embeddings(self):
+        """
+        Normalized embeddings of the fail conditions and error types.
+        Cached on disk, keyed by a hash of the taxonomy and the model name, so they are only
+        re-encoded when _Database/fail_reason.py changes; kept on the instance after the first load.
+        """
         error_conditions = self._get_fail_conditions()
+        taxonomy_key = hashlib.sha1(
+            json.dumps([self.model_name, error_conditions, ERROR_TYPES]).encode('utf-8')
+        ).hexdigest()
+        if self._taxonomy_embeddings is not None and self._taxonomy_embeddings[0] == taxonomy_key:
+            return self._taxonomy_embeddings[1]
+
+        embeddings = self._load_taxonomy_embeddings(taxonomy_key, error_conditions)
+        if embeddings is None:
+            print(f"[INFO] Encoding fail reason taxonomy to {self.taxonomy_embeddings_path}")
+            condition_embeddings = self.model.encode(error_conditions, convert_to_numpy=True, normalize_embeddings=True)
+            type_embeddings = self.model.encode(ERROR_TYPES, convert_to_numpy=True, normalize_embeddings=True)
+            # Written whole through a temp file, so a concurrent reader never loads a half-written npz
+            buffer = io.BytesIO()
+            np.savez(buffer, taxonomy_key=taxonomy_key,
+                     condition_embeddings=condition_embeddings, type_embeddings=type_embeddings)
+            atomic_write(self.taxonomy_embeddings_path, buffer.getvalue())
+            embeddings = (error_conditions, condition_embeddings, type_embeddings)
+
+        self._taxonomy_embeddings = (taxonomy_key, embeddings)
+        return embeddings
+
+    def _load_taxonomy_embeddings(self, taxonomy_key, error_conditions):
+        if not os.path.exists(self.taxonomy_embeddings_path):
+            return None
+        try:
+            with np.load(self.taxonomy_embeddings_path) as cached:
+                if str(cached["taxonomy_key"]) != taxonomy_key:
+                    return None
+                return error_conditions, cached["condition_embeddings"], cached["type_embeddings"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"⚠️ Ignoring unreadable {self.taxonomy_embeddings_path}: {e}")
+            return None
+    
+    def _reorganize_error_reasons(self, error_reasons):
+        """Classify many LLM replies at once: one encode of the replies and one matrix product per label set."""
+        error_conditions, condition_embeddings, type_embeddings = self._get_taxonomy_embeddings()
+
+        # 產生嵌入並計算相似度
+        error_msg_embeddings = self.model.encode(error_reasons, convert_to_numpy=True, normalize_embeddings=True)
+        best_match_condition_idx = (error_msg_embeddings @ condition_embeddings.T).argmax(axis=1)
+        best_match_type_idx = (error_msg_embeddings @ type_embeddings.T).argmax(axis=1)
+
+        # 找到相似度最高的條件與錯誤類型，並整理結果
+        organized_error_reasons = []
+        for row, error_reason in enumerate(error_reasons):
+            organized_error_reasons.append({
+                "error_type": ERROR_TYPES[best_match_type_idx[row]],
+                "error_condition": error_conditions[best_match_condition_idx[row]],
+                "full_error_reason": error_reason
+            })
+
+        return organized_error_reasons
 
-        # 產生嵌入
-        error_msg_embedding = self.model.encode(error_reason, convert_to_tensor=True)
-        condition_embeddings = self.model.encode(error_conditions, convert_to_tensor=True)
-        type_embeddings = self.model.encode(error_types, convert_to_tensor=True)
-
-        # 計算相似度
-        cosine_scores_condition = util.cos_sim(error_msg_embedding, condition_embeddings)
-        cosine_scores_type = util.cos_sim(error_msg_embedding, type_embeddings)
-
-        # 找到相似度最高的條件與錯誤類型
-        best_match_condition_idx = cosine_scores_condition.argmax()
-        selected_condition = error_conditions[best_match_condition_idx]
-
-        best_match_type_idx = cosine_scores_type.argmax()
-        selected_error_type = error_types[best_match_type_idx]
-
-        # 整理結果
-        organized_error_reason = {
-            "error_type": selected_error_type,
-            "error_condition": selected_condition,
-            "full_error_reason": error_reason
-        }
-
-        return organized_error_reason
+    def _reorganize_error_reason(self, error_reason):
+        return self._reorganize_error_reasons([error_reason])[0]
 
     def _get_detail_log_content(self, case_name):
-        for test_log in self.test_log_json_content:
-            if test_log["test_name"] == case_name:
-                return test_log
+        return self.test_log_repository.get(case_name)
 
 
     def analysis_process(self, case_name, image_path=None):
@@ -145,6 +195,35 @@ Instruction:
 
         return organized_error_reason
 
+    def batch_analysis_process(self, fail_cases, report_path=None, max_concurrency=5):
+        """
+        Triage every failure from FailLogCollector.collect_process in one go.
+        Prompts are sent concurrently (at most max_concurrency in flight) and all replies are
+        classified in a single embedding pass. A case whose LLM call fails gets an "error" entry
+        instead of aborting the batch. The report is written to report_path as one JSON list.
+        """
+        prompts = [self._generate_prompt(fail_case) for fail_case in fail_cases]
+        replies = self.chat_api_connector.map_chat_responses(
+            prompts, self._get_system_role_msg(), max_concurrency=max_concurrency, return_exceptions=True
+        )
+
+        answered_rows = [row for row, reply in enumerate(replies) if isinstance(reply, str)]
+        organized_error_reasons = self._reorganize_error_reasons([replies[row] for row in answered_rows]) if answered_rows else []
+        organized_by_row = dict(zip(answered_rows, organized_error_reasons))
+
+        report = []
+        for row, fail_case in enumerate(fail_cases):
+            if row in organized_by_row:
+                report.append({"test_name": fail_case["test_name"], **organized_by_row[row]})
+            else:
+                print(f"❌ Failed to analyze {fail_case['test_name']}: {replies[row]}")
+                report.append({"test_name": fail_case["test_name"], "error": str(replies[row])})
+
+        if report_path:
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=4)
+        return report
+
     
 
 if __name__ == "__main__":
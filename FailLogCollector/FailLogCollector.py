@@ -1,114 +1,353 @@
 import re
 import os
+import glob
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Lines inside a test that are dropped from its log. A str is matched as a literal substring,
+# a compiled pattern with search(); literals are much cheaper, so prefer them where possible.
+DEFAULT_NOISE_RULES = (
+    'HTTP/1.1" 201 None',
+    'HTTP/1.1" 200 None',
+    'response message',
+)
+
+# Bytes of the log's first line compared between polls to notice a log rewritten in place
+TAIL_HEAD_BYTES = 4096
+
+class TestItemParser:
+    """
+    Incremental pytest.log parser. Feed it one line at a time; a test record is returned as soon as
+    the test is complete, so only the body of the test currently running is held in memory.
+    """
+    # 取得 test_name 的正則表達式（原本的內容中，name 欄位包含整行，例：
+    # "[test_launch_process_1_1] GDPR shows up when first launch"）
+    start_pattern = re.compile(
+        r"Start TestItem: request_body=.*?'name':\s*'([^']+)'"
+    )
+    # 取得 test_result 的正則表達式
+    finish_pattern = re.compile(
+        r"Finish TestItem: request_body=.*?'status':\s*'([^']+)'"
+    )
+    # Literal prefixes of the two patterns above; the regexes only run on lines containing them
+    start_marker = "Start TestItem"
+    finish_marker = "Finish TestItem"
+    inner_name_pattern = re.compile(r"\[(.*?)\]")
+    result_mapping = {"PASSED": "PASS", "FAILED": "FAIL", "SKIPPED": "SKIP"}
+
+    def __init__(self, noise_rules=DEFAULT_NOISE_RULES, verbose=True):
+        self.current_test = None
+        self.verbose = verbose
+        self.noise_literals = tuple(rule for rule in noise_rules if isinstance(rule, str))
+        self.noise_patterns = tuple(rule for rule in noise_rules if not isinstance(rule, str))
+
+    def _is_noise(self, line_stripped):
+        for literal in self.noise_literals:
+            if literal in line_stripped:
+                return True
+        for pattern in self.noise_patterns:
+            if pattern.search(line_stripped):
+                return True
+        return False
+
+    def feed(self, line):
+        """Consume one log line. Returns the record of a test that just ended, else None."""
+        line_stripped = line.strip()
+
+        # 嘗試匹配測試開始行
+        match_start = self.start_marker in line_stripped and self.start_pattern.search(line_stripped)
+        if match_start:
+            # 若已有上一個 test 未結束，先回傳
+            unfinished_test = self.current_test
+            # 取得原始的 test_name，再取出 [] 內的內容
+            full_name = match_start.group(1)
+            inner_name_match = self.inner_name_pattern.search(full_name)
+            if inner_name_match:
+                test_name = inner_name_match.group(1)
+            else:
+                test_name = full_name
+
+            self.current_test = {
+                "test_name": test_name,
+                "test_result": "",
+                "test_log": []
+            }
+            if self.verbose:
+                print("Found test start:", self.current_test["test_name"])
+            return unfinished_test
+
+        if self.current_test is None:
+            # Outside a test only a start line matters
+            return None
+
+        # 嘗試匹配測試結束行
+        match_finish = self.finish_marker in line_stripped and self.finish_pattern.search(line_stripped)
+        if match_finish:
+            raw_result = match_finish.group(1).upper()
+            self.current_test["test_result"] = self.result_mapping.get(raw_result, raw_result)
+
+            if self.verbose:
+                print("Found test finish with result:", self.current_test["test_result"])
+            finished_test = self.current_test
+            self.current_test = None
+            return finished_test
+
+        # 在測試區段中，將該行加入 test_log (排除 noise rules，例如 "HTTP/1.1" 201 None 的行)
+        if not self._is_noise(line_stripped):
+            self.current_test["test_log"].append(line_stripped)
+        return None
+
+    def feed_lines(self, lines):
+        """
+        Consume many lines and yield test records as they end. Same result as calling feed() per line,
+        but plain log lines inside a test (the vast majority) are handled inline without the regexes.
+        """
+        feed = self.feed
+        current_log = self.current_test["test_log"] if self.current_test else None
+        noise_literals = self.noise_literals
+        noise_patterns = self.noise_patterns
+        start_marker = self.start_marker
+        # Both start and finish lines contain it, so one substring test classifies a line
+        shared_marker = "TestItem"
+
+        for line in lines:
+            if shared_marker not in line:
+                if current_log is None:
+                    continue
+                line_stripped = line.strip()
+                for literal in noise_literals:
+                    if literal in line_stripped:
+                        break
+                else:
+                    if not noise_patterns or not self._is_noise(line_stripped):
+                        current_log.append(line_stripped)
+                continue
+
+            if current_log is None and start_marker not in line:
+                continue
+            test_item = feed(line)
+            current_log = self.current_test["test_log"] if self.current_test else None
+            if test_item:
+                yield test_item
+
+    def flush(self):
+        """Return the test still open at the end of the log (it has no result), if any."""
+        unfinished_test = self.current_test
+        self.current_test = None
+        return unfinished_test
+
 
 class FailLogCollector:
-    def __init__(self, path_setting):
+    def __init__(self, path_setting, noise_rules=DEFAULT_NOISE_RULES, verbose=True):
+        self.noise_rules = noise_rules
+        self.verbose = verbose
         self.log_path = path_setting['log_path']
         if not os.path.exists(self.log_path):
             raise FileNotFoundError(f"Log file not found: {self.log_path}")
-        self.error_log_json_path = path_setting['json_path']
+        self.error_log_json_path = path_setting.get('json_path')
         self.fail_cases = []
 
-    def _get_log_from_pytest_log(self):
-        test_items = []
-        current_test = None
-        in_test_section = False
-
-        # 取得 test_name 的正則表達式（原本的內容中，name 欄位包含整行，例：
-        # "[test_launch_process_1_1] GDPR shows up when first launch"）
-        start_pattern = re.compile(
-            r"Start TestItem: request_body=.*?'name':\s*'([^']+)'"
-        )
-        # 取得 test_result 的正則表達式
-        finish_pattern = re.compile(
-            r"Finish TestItem: request_body=.*?'status':\s*'([^']+)'"
-        )
+        # Tail mode state: the file being read (inode and first line), bytes consumed so far,
+        # an incomplete last line and the open test
+        self._reset_tail()
+
+    def _reset_tail(self):
+        self.tail_inode = None
+        self.tail_head = b""
+        self.tail_offset = 0
+        self.tail_partial_line = b""
+        self.tail_parser = TestItemParser(self.noise_rules, self.verbose)
 
+    def iter_test_items(self):
+        """Yield every test record of the log in a single streaming pass."""
+        parser = TestItemParser(self.noise_rules, self.verbose)
+        total = 0
         with open(self.log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line_stripped = line.strip()
+            for test_item in parser.feed_lines(f):
+                total += 1
+                yield test_item
 
-                # 嘗試匹配測試開始行
-                match_start = start_pattern.search(line_stripped)
-                if match_start:
-                    # 若已有上一個 test 未結束，先存入
-                    if current_test:
-                        test_items.append(current_test)
-                    # 取得原始的 test_name，再取出 [] 內的內容
-                    full_name = match_start.group(1)
-                    inner_name_match = re.search(r"\[(.*?)\]", full_name)
-                    if inner_name_match:
-                        test_name = inner_name_match.group(1)
-                    else:
-                        test_name = full_name
-
-                    current_test = {
-                        "test_name": test_name,
-                        "test_result": "",
-                        "test_log": []
-                    }
-                    in_test_section = True
-                    # Debug:
-                    print("Found test start:", current_test["test_name"])
-                    continue
+        test_item = parser.flush()
+        if test_item:
+            total += 1
+            yield test_item
+        print("Total test items found:", total)
 
-                # 嘗試匹配測試結束行
-                match_finish = finish_pattern.search(line_stripped)
-                if match_finish and current_test:
-                    raw_result = match_finish.group(1).upper()
-                    if raw_result == "PASSED":
-                        current_test["test_result"] = "PASS"
-                    elif raw_result == "FAILED":
-                        current_test["test_result"] = "FAIL"
-                    elif raw_result == "SKIPPED":
-                        current_test["test_result"] = "SKIP"
-                    else:
-                        current_test["test_result"] = raw_result
-
-                    print("Found test finish with result:", current_test["test_result"])
-                    test_items.append(current_test)
-                    current_test = None
-                    in_test_section = False
-                    continue
+    def iter_fail_cases(self):
+        """Yield failure records as the log is read; passing tests are dropped as soon as they finish."""
+        for item in self.iter_test_items():
+            if item.get('test_result', '').upper() == 'FAIL':
+                yield item
+
+    def poll(self, only_failures=False):
+        """
+        Tail mode: parse only the bytes appended since the previous poll and return the test records
+        completed by them. A test is returned as soon as its Finish TestItem line has been written.
+        If the log was truncated, or replaced by another file (a new inode, or a different first line),
+        parsing restarts from the beginning even when the new log is already longer than the old one.
+        """
+        with open(self.log_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            head = f.readline(TAIL_HEAD_BYTES)
+            # The first line may still have been growing at the previous poll, so only a differing prefix counts
+            if self.tail_inode is not None and (
+                    stat.st_ino != self.tail_inode or stat.st_size < self.tail_offset or not head.startswith(self.tail_head)):
+                print(f"[INFO] {self.log_path} was truncated or replaced, restarting from the beginning")
+                self._reset_tail()
+            self.tail_inode = stat.st_ino
+            self.tail_head = head
+
+            f.seek(self.tail_offset)
+            appended = f.read()
+        self.tail_offset += len(appended)
 
-                # 若在測試區段中，將該行加入 test_log (排除包含 "HTTP/1.1" 201 None 的行)
-                if in_test_section and current_test:
-                    if 'HTTP/1.1" 201 None' in line_stripped or 'HTTP/1.1" 200 None' in line_stripped or 'response message' in line_stripped:
-                        continue
-                    current_test["test_log"].append(line_stripped)
+        # Only complete lines are parsed; the unterminated rest waits for the next poll
+        lines = (self.tail_partial_line + appended).split(b"\n")
+        self.tail_partial_line = lines.pop()
+        test_items = self.tail_parser.feed_lines(line.decode("utf-8") for line in lines)
 
-        if current_test:
-            test_items.append(current_test)
+        if only_failures:
+            return [item for item in test_items if item["test_result"] == "FAIL"]
+        return list(test_items)
 
-        print("Total test items found:", len(test_items))
+    def follow(self, poll_interval=1.0, stop_event=None, only_failures=True):
+        """
+        Tail mode generator for a pytest run that is still writing the log.
+        Yields completed records until stop_event (a threading.Event) is set, then drains what is left.
+        """
+        while True:
+            stopping = stop_event is not None and stop_event.is_set()
+            for test_item in self.poll(only_failures):
+                yield test_item
+            if stopping:
+                return
+            time.sleep(poll_interval)
 
+    def _save_fail_cases(self, fail_items):
         with open(self.error_log_json_path, "w", encoding="utf-8") as out_f:
-            json.dump(test_items, out_f, ensure_ascii=False, indent=2)
-
-    def _get_fail_cases(self):
-        with open(self.error_log_json_path, 'r') as f:
-            data = json.load(f)
-            
-            for item in data:
-                if item.get('test_result', '').upper() == 'FAIL':
-                    test_name = item.get('test_name', '')
-                    test_log = item.get('test_log', [])
-                    self.fail_cases.append({"test_name": test_name, "test_log": test_log})
-
-    def collect_process(self):
-        self._get_log_from_pytest_log()
-        self._get_fail_cases()
+            json.dump(fail_items, out_f, ensure_ascii=False, separators=(',', ':'))
+
+    def collect_process(self, save_json=False):
+        """
+        Collect the failed test cases in one pass over the log.
+        save_json: also write the failing test records to json_path (compact encoding)
+        """
+        fail_items = list(self.iter_fail_cases())
+        if save_json:
+            self._save_fail_cases(fail_items)
+
+        self.fail_cases = [{"test_name": item["test_name"], "test_log": item["test_log"]} for item in fail_items]
         return self.fail_cases
     
 
+def _collect_shard(log_path, noise_rules):
+    """Process pool worker: parse one shard and return what the merge needs, plus its timing."""
+    start = time.perf_counter()
+    collector = FailLogCollector({'log_path': log_path}, noise_rules=noise_rules, verbose=False)
+    attempts = []
+    fail_records = {}
+    for item in collector.iter_test_items():
+        attempts.append((item["test_name"], item["test_result"]))
+        if item["test_result"] == "FAIL":
+            # A retried test keeps the log of its last failing attempt in this shard
+            fail_records[item["test_name"]] = item["test_log"]
+    return attempts, fail_records, time.perf_counter() - start
+
+
+class ShardedFailLogCollector:
+    """
+    Collect failures from several pytest.log files (one per worker) in a process pool.
+    Tests are merged by name: a test that passed in any attempt, on any shard, counts as passed
+    (it was retried successfully); otherwise its record comes from its last failing attempt,
+    taking shards in the given order. The fail list is ordered by first appearance.
+    """
+    def __init__(self, log_paths, json_path=None, noise_rules=DEFAULT_NOISE_RULES, max_workers=None):
+        """
+        log_paths: a glob pattern or a list of paths/glob patterns; glob matches are sorted
+        """
+        if isinstance(log_paths, str):
+            log_paths = [log_paths]
+        self.log_paths = []
+        for pattern in log_paths:
+            matched_paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            for log_path in matched_paths:
+                if not os.path.exists(log_path):
+                    raise FileNotFoundError(f"Log file not found: {log_path}")
+                if log_path not in self.log_paths:
+                    self.log_paths.append(log_path)
+        if not self.log_paths:
+            raise FileNotFoundError(f"No log files match: {log_paths}")
+
+        self.error_log_json_path = json_path
+        self.noise_rules = noise_rules
+        self.max_workers = max_workers
+        self.fail_cases = []
+        self.shard_timings = []
+
+    def _merge_shards(self, shard_results):
+        first_seen = {}
+        passed = set()
+        fail_records = {}
+        for log_path, (attempts, shard_fail_records, _) in zip(self.log_paths, shard_results):
+            for test_name, test_result in attempts:
+                entry = first_seen.setdefault(test_name, {"attempts": 0, "failed_in": []})
+                entry["attempts"] += 1
+                if test_result == "PASS":
+                    passed.add(test_name)
+                elif test_result == "FAIL" and log_path not in entry["failed_in"]:
+                    entry["failed_in"].append(log_path)
+            fail_records.update(shard_fail_records)
+
+        return [
+            {
+                "test_name": test_name,
+                "test_log": fail_records[test_name],
+                "attempts": entry["attempts"],
+                "log_paths": entry["failed_in"],
+            }
+            for test_name, entry in first_seen.items()
+            if test_name in fail_records and test_name not in passed
+        ]
+
+    def collect_process(self, save_json=False):
+        """
+        Parse all shards in parallel (serially with max_workers=1) and return the merged fail list.
+        Per-shard parse times are kept in self.shard_timings.
+        """
+        if self.max_workers == 1:
+            shard_results = [_collect_shard(log_path, self.noise_rules) for log_path in self.log_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                shard_results = list(executor.map(_collect_shard, self.log_paths, [self.noise_rules] * len(self.log_paths)))
+
+        self.shard_timings = []
+        for log_path, (attempts, shard_fail_records, seconds) in zip(self.log_paths, shard_results):
+            self.shard_timings.append({
+                "log_path": log_path,
+                "seconds": seconds,
+                "tests": len(attempts),
+                "failures": len(shard_fail_records),
+            })
+            print(f"[INFO] {log_path}: {len(attempts)} tests, {len(shard_fail_records)} failed, parsed in {seconds:.2f}s")
+
+        self.fail_cases = self._merge_shards(shard_results)
+        print("Total failed test cases after merge:", len(self.fail_cases))
+
+        if save_json:
+            with open(self.error_log_json_path, "w", encoding="utf-8") as out_f:
+                json.dump([dict(item, test_result="FAIL") for item in self.fail_cases], out_f,
+                          ensure_ascii=False, separators=(',', ':'))
+        return self.fail_cases
+
+
 if __name__ == "__main__":
     path_setting = {
         'log_path': r"E:\Debby\5_ATCases\230721_Organize\PDRMac_BFT_reportportal\pytest.log",
         'json_path': r"E:\Debby\9_Scripts\AIAgentSystem\_Database\pytest_error_log.json"
     }
     collector = FailLogCollector(path_setting)
-    fail_cases = collector.collect_process()
+    fail_cases = collector.collect_process(save_json=True)
     print(f'There are {len(fail_cases)} failed test cases.\n Fail cases:')
     for case in fail_cases:
         print(f'  {case.get("test_name", "")}')
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Throughput benchmark for pytest.log parsing.
+
+Writes a synthetic ReportPortal-style debug log (1M lines by default) to a temp dir and times
+the previous per-line regex parser against TestItemParser. Both must produce the same records.
+
+    python FailLogCollector/benchmark_log_parser.py [--lines 1000000]
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+# Run as a script, so the sibling module is importable directly
+from FailLogCollector import TestItemParser
+
+
+def write_synthetic_log(log_path, total_lines, lines_per_test=200, seed=0):
+    rng = random.Random(seed)
+    statuses = ['passed', 'passed', 'passed', 'failed', 'skipped']
+    written = 0
+    test_no = 0
+    with open(log_path, "w", encoding="utf-8") as f:
+        while written < total_lines:
+            f.write("DEBUG    reportportal_client.client:client.py:600 Start TestItem: request_body="
+                    f"{{'attributes': [], 'name': '[test_media_room_func_{test_no}] Import media', 'start_time': '1700000000'}}\n")
+            for i in range(lines_per_test):
+                roll = rng.random()
+                if roll < 0.3:
+                    f.write('DEBUG    urllib3.connectionpool:connectionpool.py:456 http://rp:8080 "POST /api/v2/log HTTP/1.1" 201 None\n')
+                elif roll < 0.4:
+                    f.write("DEBUG    reportportal_client.client:client.py:700 response message: OK\n")
+                else:
+                    f.write(f"DEBUG    my_package:__init__.py:122 [STEP]: [Action] step {i} of test {test_no}\n")
+            f.write("DEBUG    reportportal_client.client:client.py:690 Finish TestItem: request_body="
+                    f"{{'end_time': '1700000001', 'status': '{rng.choice(statuses)}', 'issue': None}}\n")
+            written += lines_per_test + 2
+            test_no += 1
+
+
+def legacy_parse(log_path):
+    """The line loop FailLogCollector used before the literal prefilter, without its prints."""
+    test_items = []
+    current_test = None
+    in_test_section = False
+    start_pattern = re.compile(r"Start TestItem: request_body=.*?'name':\s*'([^']+)'")
+    finish_pattern = re.compile(r"Finish TestItem: request_body=.*?'status':\s*'([^']+)'")
+
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line_stripped = line.strip()
+            match_start = start_pattern.search(line_stripped)
+            if match_start:
+                if current_test:
+                    test_items.append(current_test)
+                full_name = match_start.group(1)
+                inner_name_match = re.search(r"\[(.*?)\]", full_name)
+                test_name = inner_name_match.group(1) if inner_name_match else full_name
+                current_test = {"test_name": test_name, "test_result": "", "test_log": []}
+                in_test_section = True
+                continue
+
+            match_finish = finish_pattern.search(line_stripped)
+            if match_finish and current_test:
+                raw_result = match_finish.group(1).upper()
+                current_test["test_result"] = {"PASSED": "PASS", "FAILED": "FAIL", "SKIPPED": "SKIP"}.get(raw_result, raw_result)
+                test_items.append(current_test)
+                current_test = None
+                in_test_section = False
+                continue
+
+            if in_test_section and current_test:
+                if 'HTTP/1.1" 201 None' in line_stripped or 'HTTP/1.1" 200 None' in line_stripped or 'response message' in line_stripped:
+                    continue
+                current_test["test_log"].append(line_stripped)
+
+    if current_test:
+        test_items.append(current_test)
+    return test_items
+
+
+def fast_parse(log_path):
+    parser = TestItemParser(verbose=False)
+    test_items = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        test_items.extend(parser.feed_lines(f))
+    test_item = parser.flush()
+    if test_item:
+        test_items.append(test_item)
+    return test_items
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--lines", type=int, default=1_000_000)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = os.path.join(tmp_dir, "pytest.log")
+        write_synthetic_log(log_path, args.lines)
+        size_mb = os.path.getsize(log_path) / 1024 / 1024
+        print(f"Synthetic log: {args.lines} lines, {size_mb:.1f} MB")
+
+        timings = {}
+        results = {}
+        for name, parse in (("legacy", legacy_parse), ("prefilter", fast_parse)):
+            start = time.perf_counter()
+            results[name] = parse(log_path)
+            timings[name] = time.perf_counter() - start
+            print(f"  {name:<10} {timings[name]:6.2f}s  {args.lines / timings[name] / 1e6:5.2f}M lines/s")
+
+        if results["legacy"] != results["prefilter"]:
+            raise AssertionError("Parsers disagree on the synthetic log")
+        print(f"Speedup: {timings['legacy'] / timings['prefilter']:.2f}x ({len(results['prefilter'])} tests, identical output)")
+
+
+if __name__ == "__main__":
+    main()
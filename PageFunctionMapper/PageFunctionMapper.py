@@ -1,5 +1,5 @@
-import json
-from sentence_transformers import SentenceTransformer, util
+import faiss
+import numpy as np
 
 import sys
 import os
@@ -24,8 +24,22 @@ class SearchPageFunctions(SearchBase):
             {"name": "self.open_packed_project(project_name, save_name)", "description": "[Action] Open packed project"},
             {"name": "self.open_recent_project(project_name, save_name)", "description": "[Action] Open Recent Project"},
         ]
-
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.page_row_ids = self._build_page_row_ids()
+        self.row_pages = [self._get_page_name(func) for func in self.data]
+        self.row_has_description = np.array([bool(func.get("description")) for func in self.data])
+        # (selector, search params) per page combination; also keeps the selector alive for FAISS
+        self.page_search_params = {}
+
+    def _get_page_name(self, func):
+        """Page a function belongs to, e.g. 'media_room_page' for 'media_room_page.tag.add(name)'."""
+        return func.get("page") or func.get("name", "").split(".", 1)[0]
+
+    def _build_page_row_ids(self):
+        """Map each page to the FAISS row ids of its functions."""
+        page_row_ids = {}
+        for row_id, func in enumerate(self.data):
+            page_row_ids.setdefault(self._get_page_name(func), []).append(row_id)
+        return page_row_ids
 
     def _get_descriptions(self, data=None):
         """Get descriptions for page functions."""
@@ -47,84 +61,49 @@ class SearchPageFunctions(SearchBase):
                 step = step.split(exclusion, 1)[0].strip()
         return step
 
-    def _get_related_pages_from_step(self, step, similarity_threshold=0.4):
-        # Load JSON file containing page descriptions.
-        with open(self.json_path, 'r', encoding='utf-8') as f:
-            try:
-                pages = json.load(f)
-            except json.decoder.JSONDecodeError as e:
-                print("Error decoding JSON:", e)
-                return []
-        
-        related_pages = []
-        
-        # Get embedding for the step
-        step_embedding = self.model.encode(step, convert_to_tensor=True)
-        
-        # Handle pages as a list of dictionaries
-        for page_info in pages:
-            # Assuming each page_info has a 'page' key and a 'description' key
-            page = page_info.get("page", "")
-            description = page_info.get("description", "")
-            
-            if not description:
-                continue
-            
-            # Compute embedding for the page description
-            desc_embedding = self.model.encode(description, convert_to_tensor=True)
-            similarity = util.pytorch_cos_sim(step_embedding, desc_embedding).item()
-            
-            if similarity >= similarity_threshold:
-                if page not in related_pages:
-                    # This is a bug in your original code: 
-                    # related_pages.append[page] should be related_pages.append(page)
-                    related_pages.append(page)
-        
-        return related_pages
-    
-    def _reload_filtered_data_to_extract_relevant(self, related_pages):
-        if 'main_page' not in related_pages:
-            related_pages.append('main_page')
-
-        # Load the functions from the JSON file
-        with open(self.json_path, "r", encoding="utf-8") as f:
-            functions = json.load(f)
+    def _get_related_pages_from_similarity(self, similarity_row, similarity_threshold=0.4):
+        """Pages whose function descriptions reach the threshold, in row order."""
+        matched_rows = np.nonzero((similarity_row >= similarity_threshold) & self.row_has_description)[0]
+        return list(dict.fromkeys(self.row_pages[row_id] for row_id in matched_rows))
 
-        # Filter functions whose name starts with any of the related pages
-        related_functions = [
-            func for func in functions
-            if any(func["name"].startswith(page) for page in related_pages)
-        ]
+    def _get_related_pages_from_embeddings(self, step_embeddings, similarity_threshold=0.4):
+        """Related pages of each already encoded step: one matrix product for all of them."""
+        similarity = self._get_similarity_matrix(step_embeddings)
+        return [self._get_related_pages_from_similarity(row, similarity_threshold) for row in similarity]
 
-        # Dump the filtered functions to a new JSON file
-        with open(self.filtered_path, "w", encoding="utf-8") as f:
-            json.dump(related_functions, f, indent=4)
+    def _get_related_pages_from_step(self, step, similarity_threshold=0.4):
+        return self._get_related_pages_from_steps([step], similarity_threshold)[0]
 
-        self._load_data(filtered_path=self.filtered_path)
-        self._load_or_build_faiss_index(True)
+    def _get_related_pages_from_steps(self, steps, similarity_threshold=0.4):
+        """Batched _get_related_pages_from_step: one encode and one matrix product for all steps."""
+        return self._get_related_pages_from_embeddings(self._encode_queries(steps), similarity_threshold)
 
+    def _get_page_search_params(self, related_pages):
+        """Build FAISS search parameters that only visit the rows of the related pages."""
+        if 'main_page' not in related_pages:
+            related_pages.append('main_page')
 
-    def extract_relevant_functions_step_by_step(self, step, debug_mode=False):
-        """Extract relevant functions step by step, applying whitelist filtering."""
-        relevant_functions = self.default_functions
+        pages_key = tuple(sorted(set(related_pages)))
+        if pages_key not in self.page_search_params:
+            row_ids = sorted({
+                row_id for page in pages_key for row_id in self.page_row_ids.get(page, [])
+            })
+            selector = faiss.IDSelectorBatch(np.array(row_ids, dtype='int64'))
+            self.page_search_params[pages_key] = (selector, faiss.SearchParameters(sel=selector))
+        return self.page_search_params[pages_key][1]
+
+    def _collect_relevant_functions(self, step, related_pages, step_embedding, debug_mode):
+        relevant_functions = list(self.default_functions)
         seen_functions = set()
 
-        # for step in test_steps.split("\n"):
-            # print(step)
-        step = self._regular_step(step)
-
-        if not step:
-            # print(f"[INFO] Skipping step due to whitelist exclusion.")
-            return []
-        
-        related_pages = self._get_related_pages_from_step(step)
         if not related_pages:
             # print(f"[INFO] No related pages found for step: {step}")
             return None
         
-        self._reload_filtered_data_to_extract_relevant(related_pages)
+        search_params = self._get_page_search_params(related_pages)
 
-        relevant_items = self.extract_relevant_items(step, debug_mode=debug_mode, is_page_function=True)
+        relevant_items = self.extract_relevant_items(step, debug_mode=debug_mode, is_page_function=True,
+                                                     search_params=search_params, query_embedding=step_embedding)
         if not relevant_items:
             # print(f"[INFO] No relevant functions found for step: {step}")
             return None
@@ -136,6 +115,36 @@ class SearchPageFunctions(SearchBase):
                 relevant_functions.append(item)
 
         return relevant_functions if relevant_functions else None
+
+    def extract_relevant_functions_step_by_step(self, step, debug_mode=False):
+        """Extract relevant functions step by step, applying whitelist filtering."""
+        step = self._regular_step(step)
+
+        if not step:
+            # print(f"[INFO] Skipping step due to whitelist exclusion.")
+            return []
+
+        step_embedding = self._encode_queries([step])
+        related_pages = self._get_related_pages_from_embeddings(step_embedding)[0]
+        return self._collect_relevant_functions(step, related_pages, step_embedding, debug_mode)
+
+    def extract_relevant_functions_for_steps(self, test_steps, debug_mode=False):
+        """
+        Same as calling extract_relevant_functions_step_by_step on every line of test_steps,
+        but all steps are encoded and related to pages in one batch.
+        Returns one result per line, in order.
+        """
+        steps = [self._regular_step(step) for step in test_steps.split("\n")]
+        active_rows = [i for i, step in enumerate(steps) if step]
+        results = [[] for _ in steps]
+        if not active_rows:
+            return results
+
+        step_embeddings = self._encode_queries([steps[i] for i in active_rows])
+        related_pages_list = self._get_related_pages_from_embeddings(step_embeddings)
+        for row, (i, related_pages) in enumerate(zip(active_rows, related_pages_list)):
+            results[i] = self._collect_relevant_functions(steps[i], related_pages, step_embeddings[row:row + 1], debug_mode)
+        return results
     
 
 
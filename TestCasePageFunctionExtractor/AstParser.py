@@ -0,0 +1,171 @@
+import ast
+
+class _Source():
+    """Source text split into lines, for slicing node spans without re-splitting the file per node."""
+    def __init__(self, content):
+        self.lines = content.split("\n")
+
+    def segment(self, node):
+        # col_offset / end_col_offset are UTF-8 byte offsets
+        first_line = self.lines[node.lineno - 1].encode("utf-8")
+        if node.lineno == node.end_lineno:
+            return first_line[node.col_offset:node.end_col_offset].decode("utf-8")
+        parts = [first_line[node.col_offset:].decode("utf-8")]
+        parts.extend(self.lines[node.lineno:node.end_lineno - 1])
+        parts.append(self.lines[node.end_lineno - 1].encode("utf-8")[:node.end_col_offset].decode("utf-8"))
+        return "\n".join(parts)
+
+    def lines_between(self, first_lineno, last_lineno):
+        return "\n".join(self.lines[first_lineno - 1:last_lineno])
+
+
+def _dotted_name(node):
+    """'pytest.mark.name' for the expression pytest.mark.name, None for anything that is not a plain dotted name."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _get_string_arg(call):
+    if call.args and isinstance(call.args[0], ast.Constant) and isinstance(call.args[0].value, str):
+        return call.args[0].value
+    return None
+
+
+def _get_docstring(node):
+    if node.body and isinstance(node.body[0], ast.Expr) and isinstance(node.body[0].value, ast.Constant) \
+            and isinstance(node.body[0].value.value, str):
+        return node.body[0].value.value
+    return None
+
+
+def _format_arg(source, arg, default):
+    text = arg.arg
+    if arg.annotation is not None:
+        text += ": " + source.segment(arg.annotation)
+    if default is not None:
+        text += (" = " if arg.annotation is not None else "=") + source.segment(default)
+    return text
+
+
+def _format_parameters(source, args):
+    """Parameters as written in the signature, without self."""
+    params = []
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    for i, (arg, default) in enumerate(zip(positional, defaults)):
+        params.append(_format_arg(source, arg, default))
+        if i == len(args.posonlyargs) - 1:
+            params.append("/")
+    if args.vararg:
+        params.append("*" + _format_arg(source, args.vararg, None))
+    elif args.kwonlyargs:
+        params.append("*")
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        params.append(_format_arg(source, arg, default))
+    if args.kwarg:
+        params.append("**" + _format_arg(source, args.kwarg, None))
+    return [param for param in params if param != "self"]
+
+
+# Statement lists that can hold nested defs; expressions are never visited
+_STATEMENT_FIELDS = ("body", "orelse", "handlers", "finalbody")
+
+def _walk_definitions(statements, class_stack=()):
+    """Yield (function node, enclosing class names) in source order, descending only through statement lists."""
+    for node in statements:
+        if isinstance(node, ast.ClassDef):
+            yield from _walk_definitions(node.body, class_stack + (node.name,))
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node, class_stack
+        for field in _STATEMENT_FIELDS:
+            children = getattr(node, field, None)
+            if children:
+                yield from _walk_definitions(children, class_stack)
+        for case in getattr(node, "cases", ()):
+            yield from _walk_definitions(case.body, class_stack)
+
+
+def _get_step_description(node):
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call) and _dotted_name(decorator.func) == "step":
+            return _get_string_arg(decorator)
+    return None
+
+
+def _get_pytest_marks(node):
+    """(tags, marked_name) from the pytest.mark decorators of a function."""
+    tags = []
+    marked_name = None
+    for decorator in node.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        dotted_name = _dotted_name(call.func if call else decorator)
+        if not dotted_name or not dotted_name.startswith("pytest.mark."):
+            continue
+        tag = dotted_name[len("pytest.mark."):]
+        tags.append(tag)
+        if tag == "name" and call and marked_name is None:
+            marked_name = _get_string_arg(call)
+    return tags, marked_name
+
+
+def parse_page_functions(content, class_mapping):
+    """
+    @step-decorated functions of a page function file, in source order.
+    Class paths are lowercased and mapped through class_mapping; module level functions get 'UnknownClass'.
+    start_line / end_line (1-based, inclusive) span the function from its first decorator to the end of its body.
+    Raises SyntaxError if content is not valid Python.
+    """
+    tree = ast.parse(content)
+    source = _Source(content)
+    extracted_functions = []
+    for node, class_stack in _walk_definitions(tree.body):
+        step_description = _get_step_description(node)
+        if not step_description:
+            continue
+        class_path_parts = [name.lower() for name in class_stack] or ["UnknownClass"]
+        corrected_class_path = ".".join([class_mapping.get(part, part) for part in class_path_parts])
+        final_params_str = ", ".join(_format_parameters(source, node.args))
+        extracted_functions.append({
+            "name": f"{corrected_class_path}.{node.name}({final_params_str})",
+            "description": step_description.strip(),
+            "start_line": min(decorator.lineno for decorator in node.decorator_list),
+            "end_line": node.end_lineno,
+        })
+    return extracted_functions
+
+
+def parse_test_cases(content):
+    """
+    Functions carrying pytest.mark decorators and a docstring, in source order.
+    full_code is the source from the first decorator line to the end of the body; start_line / end_line
+    (1-based, inclusive) are that span.
+    Raises SyntaxError if content is not valid Python.
+    """
+    tree = ast.parse(content)
+    source = _Source(content)
+    extracted_tests = []
+    for node, _ in _walk_definitions(tree.body):
+        tags, marked_name = _get_pytest_marks(node)
+        docstring = _get_docstring(node)
+        if not tags or docstring is None:
+            continue
+        if "name" in tags:
+            tags.remove("name")
+        first_lineno = min([decorator.lineno for decorator in node.decorator_list])
+        extracted_tests.append({
+            "name": node.name,
+            "tags": tags,
+            "marked_name": marked_name or node.name,
+            "description": [step.strip() for step in docstring.split("\n") if step.strip()],
+            "full_code": source.lines_between(first_lineno, node.end_lineno).strip(),
+            "start_line": first_lineno,
+            "end_line": node.end_lineno,
+        })
+    return extracted_tests
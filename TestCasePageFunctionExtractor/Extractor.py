@@ -2,11 +2,22 @@ import re
 import json
 import os
 import sys
+import hashlib
+import bisect
+from concurrent.futures import ProcessPoolExecutor
 
 parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_path)
 
 from _Database.mapping_table import class_mapping
+from TestCasePageFunctionExtractor.AstParser import parse_page_functions, parse_test_cases
+from _BasicTool.JsonJournal import JsonJournal
+
+# Bump when the extraction output changes, so stale per-file caches are thrown away
+_CACHE_VERSION = 3
+
+# Source span of a record; moving a record within its file does not count as changing it
+_SPAN_KEYS = ("start_line", "end_line")
 
 class TestCase_PageFunction_Extractor():
     def __init__(self, path_settings, max_lines=50000):
@@ -14,46 +25,77 @@ class TestCase_PageFunction_Extractor():
         self.class_mapping = class_mapping
         self.page_function_json = path_settings['page_functions_json']
         self.test_case_json = path_settings['test_case_json']
-        
+        # file_type -> {"added": [...], "changed": [...], "removed": [...]} record names of the last extract_process
+        self.changes = {}
 
         if path_settings['page_functions_dir']:
             self.page_function_files = [
                 os.path.join(path_settings['page_functions_dir'], f)
-                for f in os.listdir(path_settings['page_functions_dir'])
+                for f in sorted(os.listdir(path_settings['page_functions_dir']))
                 if os.path.isfile(os.path.join(path_settings['page_functions_dir'], f))
             ]
 
         if path_settings['test_case_dir']:
             self.test_case_files = [
                 os.path.join(path_settings['test_case_dir'], f)
-                for f in os.listdir(path_settings['test_case_dir'])
+                for f in sorted(os.listdir(path_settings['test_case_dir']))
                 if os.path.isfile(os.path.join(path_settings['test_case_dir'], f))
             ]
 
     def _get_content_from_file(self, file_path):
-        """Load content from file (limit to max_lines if necessary)."""
+        """Load content from file."""
         print(f"🔍 Get File content from: {file_path}")
         try:
             with open(file_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                if len(lines) > self.max_lines:
-                    print(f"⚠️ File too large, only processing first {self.max_lines} lines")
-                    lines = lines[:self.max_lines]
-                content = "".join(lines)
+                content = f.read()
         except FileNotFoundError:
             print(f"❌ File not found: {file_path}")
             return []
         return content
-    
+
+    def _limit_lines(self, content):
+        """The regex fallback backtracks on huge files, so it only sees the first max_lines lines."""
+        lines = content.split("\n")
+        if len(lines) > self.max_lines:
+            print(f"⚠️ File too large, only processing first {self.max_lines} lines")
+            content = "\n".join(lines[:self.max_lines])
+        return content
+
     def _analyze_content_page_functions(self, content):
         """
-        Analyze content for Page Functions.
+        Analyze content for Page Functions with the ast module (single pass, no size limit).
+        Files that do not parse as Python fall back to the line based regex scan.
+        """
+        print("🔍 Analyzing content for page functions...")
+        try:
+            return parse_page_functions(content, self.class_mapping)
+        except SyntaxError as e:
+            print(f"⚠️ Cannot parse as Python ({e.msg}, line {e.lineno}), falling back to regex")
+            return self._analyze_content_page_functions_regex(self._limit_lines(content))
+
+    def _analyze_content_test_case(self, content):
+        """
+        Analyze content for Test Cases with the ast module (single pass, no size limit).
+        Files that do not parse as Python fall back to the regex scan.
+        """
+        print("🔍 Analyzing content for test cases...")
+        try:
+            extracted_tests = parse_test_cases(content)
+        except SyntaxError as e:
+            print(f"⚠️ Cannot parse as Python ({e.msg}, line {e.lineno}), falling back to regex")
+            return self._analyze_content_test_case_regex(self._limit_lines(content))
+        if not extracted_tests:
+            print("❌ No test cases found. Please check file format.")
+        return extracted_tests
+
+    def _analyze_content_page_functions_regex(self, content):
+        """
+        Analyze content for Page Functions, line by line (fallback for files ast cannot parse).
         Extracts:
          - The description within @step('...')
          - The function name and its parameter list (excluding self)
          - The class hierarchy (supporting nested classes correctly)
         """
-        print("🔍 Analyzing content for page functions...")
         class_stack = []  # track current class hierarchy
         extracted_functions = []
         lines = content.split("\n")
@@ -109,29 +151,48 @@ class TestCase_PageFunction_Extractor():
                         extracted_functions.append({
                             "name": full_func_name,
                             "description": step_description.strip(),
+                            "start_line": idx + 1,
+                            "end_line": self._get_block_end_line(lines, idx + 1),
                         })
         return extracted_functions
 
-    def _analyze_content_test_case(self, content):
+    def _get_block_end_line(self, lines, def_idx):
+        """1-based number of the last code line of the block opened at lines[def_idx] (comments and blank lines excluded)."""
+        def_indent = len(lines[def_idx]) - len(lines[def_idx].lstrip())
+        end_line = def_idx + 1
+        for idx in range(def_idx + 1, len(lines)):
+            stripped_line = lines[idx].strip()
+            if not stripped_line or stripped_line.startswith("#"):
+                continue
+            if len(lines[idx]) - len(lines[idx].lstrip()) <= def_indent:
+                break
+            end_line = idx + 1
+        return end_line
+
+    def _analyze_content_test_case_regex(self, content):
         """
-        Analyze content for Test Cases.
+        Analyze content for Test Cases with one multi-line regex (fallback for files ast cannot parse).
         Extracts:
          - Test case name
          - pytest.mark tags and the marked name (if any)
          - Description (split into a list)
          - Full code including markers and function definition
         """
-        print("🔍 Analyzing content for test cases...")
-        test_patterns = re.findall(
+        test_matches = list(re.finditer(
             r"((?:\s*@pytest\.mark\.[^\n]+\n\s*)+)(?:@[\w_]+\n\s*)*def (\w+)\(.*?\):\s+[\"']{3}([\s\S]+?)[\"']{3}\s*([\s\S]+?)(?=\n\s*@pytest\.mark|\Z)",
             content, re.DOTALL
-        )
-        if not test_patterns:
+        ))
+        if not test_matches:
             print("❌ No test cases found. Please check file format.")
             return []
 
+        # Offsets at which each line starts, to turn match positions into line numbers
+        line_starts = [0] + [match.end() for match in re.finditer("\n", content)]
         extracted_tests = []
-        for full_markers, test_name, description, test_content in test_patterns:
+        for match in test_matches:
+            full_markers, test_name, description, test_content = match.groups()
+            start_offset = match.start(1) + len(full_markers) - len(full_markers.lstrip())
+            end_offset = match.start(4) + len(test_content.rstrip()) - 1
             tags = re.findall(r"@pytest\.mark\.(\w+)", full_markers)
             marked_name_match = re.search(r"@pytest\.mark\.name\('([^']+)'\)", full_markers)
             marked_name = marked_name_match.group(1) if marked_name_match else test_name
@@ -145,7 +206,9 @@ class TestCase_PageFunction_Extractor():
                 "tags": tags,
                 "marked_name": marked_name,
                 "description": description_list,
-                "full_code": full_code.strip()
+                "full_code": full_code.strip(),
+                "start_line": bisect.bisect_right(line_starts, start_offset),
+                "end_line": bisect.bisect_right(line_starts, end_offset),
             })
         return extracted_tests
 
@@ -173,10 +236,100 @@ class TestCase_PageFunction_Extractor():
         print(f"✅ Found {len(extracted_content)} {file_type}(s) in {file_path}")
         return extracted_content
 
-    def extract_process(self, file_type):
+    def _get_cache_path(self, json_path):
+        return os.path.splitext(json_path)[0] + '.extract_cache.json'
+
+    def _load_cache(self, cache_path, file_type):
+        """Per-file extraction cache: {file_path: {"size", "mtime_ns", "sha1", "records"}}."""
+        if not os.path.exists(cache_path):
+            return {}
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if cache != dict(self._get_cache_header(file_type), files=cache.get("files")):
+            return {}
+        return cache.get("files") or {}
+
+    def _get_cache_header(self, file_type):
+        """Everything besides the file contents that the cached records depend on."""
+        header = {"version": _CACHE_VERSION, "file_type": file_type, "max_lines": self.max_lines}
+        if file_type == 'page_function':
+            # Class paths are mapped through class_mapping, so a changed mapping invalidates every record
+            mapping_json = json.dumps(self.class_mapping, sort_keys=True, ensure_ascii=False)
+            header["class_mapping_sha1"] = hashlib.sha1(mapping_json.encode("utf-8")).hexdigest()
+        return header
+
+    def _save_cache(self, cache_path, file_type, files):
+        cache = dict(self._get_cache_header(file_type), files=files)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+
+    def _hash_file(self, file_path):
+        with open(file_path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _get_cached_records(self, file_path, cached_entry):
+        """
+        Return (entry, reused) for file_path.
+        Size + mtime identical means unchanged; otherwise the content hash decides, so a touched but
+        unmodified file is not reparsed.
+        """
+        stat = os.stat(file_path)
+        if cached_entry and cached_entry["size"] == stat.st_size and cached_entry["mtime_ns"] == stat.st_mtime_ns:
+            return cached_entry, True
+
+        sha1 = self._hash_file(file_path)
+        if cached_entry and cached_entry["sha1"] == sha1:
+            return dict(cached_entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns), True
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1, "records": None}, False
+
+    def _read_existing_json(self, journal):
+        """The current records, as readers see them (with journaled upserts applied)."""
+        if not os.path.exists(journal.json_path):
+            return None
+        try:
+            return journal.load()
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _diff_records(self, old_records, new_records):
+        """Names of records added, changed or removed between two extraction results (a record that only moved is unchanged)."""
+        def without_span(record):
+            return {key: value for key, value in record.items() if key not in _SPAN_KEYS}
+
+        old_by_name = {record["name"]: without_span(record) for record in old_records or []}
+        new_by_name = {record["name"]: without_span(record) for record in new_records}
+        return {
+            "added": [name for name in new_by_name if name not in old_by_name],
+            "changed": [name for name, record in new_by_name.items() if name in old_by_name and old_by_name[name] != record],
+            "removed": [name for name in old_by_name if name not in new_by_name],
+        }
+
+    def _analyze_files(self, file_paths, file_type, max_workers=1):
+        """
+        Extracted records of every file, in file_paths order.
+        max_workers other than 1 spreads the files over a process pool (None: one worker per CPU).
+        """
+        workers = max_workers or os.cpu_count() or 1
+        if workers == 1 or len(file_paths) < 2:
+            return [self._organize_analyzed_data(file, file_type) for file in file_paths]
+
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._organize_analyzed_data, file_paths, [file_type] * len(file_paths),
+                                     chunksize=chunksize))
+
+    def extract_process(self, file_type, use_cache=True, max_workers=1):
         """
         Extract data from multiple files and save the result to a JSON file.
         file_type: 'page_function' or 'test_case'
+        use_cache: only reparse files whose size, mtime and content hash changed since the last run;
+                   the JSON is left untouched when no record changed.
+        max_workers: number of processes used to parse changed files (None: one per CPU); the output
+                     order is the file order either way.
+        The added/changed/removed record names are kept in self.changes[file_type].
         """
         if file_type == 'page_function':
             json_path = self.page_function_json
@@ -185,14 +338,39 @@ class TestCase_PageFunction_Extractor():
             json_path = self.test_case_json
             file_path_list = self.test_case_files
 
-        content_list = []
+        cache_path = self._get_cache_path(json_path)
+        cached_files = self._load_cache(cache_path, file_type) if use_cache else {}
+
+        files = {}
+        pending_files = []
         for file in file_path_list:
-            content_list.extend(self._organize_analyzed_data(file, file_type))
+            entry, reused = self._get_cached_records(file, cached_files.get(file))
+            files[file] = entry
+            if not reused:
+                pending_files.append(file)
+
+        for file, records in zip(pending_files, self._analyze_files(pending_files, file_type, max_workers)):
+            files[file]["records"] = records
+        content_list = [record for file in file_path_list for record in files[file]["records"]]
+        print(f"🔍 Reparsed {len(pending_files)} of {len(file_path_list)} {file_type} file(s), "
+              f"{len(file_path_list) - len(pending_files)} unchanged")
 
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(content_list, f, ensure_ascii=False, indent=4)
+        # Generated tests are journaled next to the JSON; the files on disk are the source of truth here
+        journal = JsonJournal(json_path)
+        old_content_list = self._read_existing_json(journal)
+        changes = self._diff_records(old_content_list, content_list)
+        self.changes[file_type] = changes
+        print(f"✅ {file_type}: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed")
+
+        if old_content_list == content_list and not os.path.exists(journal.journal_path):
+            print("✅ Extraction complete, no changes to save.")
+        else:
+            journal.compact(content_list)
+            print("✅ Extraction complete and data saved!")
 
-        print("✅ Extraction complete and data saved!")
+        if files != cached_files:
+            self._save_cache(cache_path, file_type, files)
         return content_list
 
 
@@ -0,0 +1,167 @@
+"""
+Benchmark for test case extraction.
+
+Writes a synthetic tree of pytest files (300 files by default) to a temp dir and times
+extract_process('test_case') serially against the process pool. Both must produce the same records.
+Then times the ast parser against the regex fallback on the same files, on one file concatenated
+from the whole tree (which the regex path truncates at max_lines), and on a file of marked tests
+without docstrings, where the regex's lazy DOTALL signature match rescans to the end of the file per test.
+On ordinary files the regex is several times faster: ast.parse itself takes about three quarters of the
+ast path, and slicing the source spans is negligible. The ast parser is there for correct results and
+a linear worst case, not for speed. On well-formed files both parsers must return identical records.
+
+    python TestCasePageFunctionExtractor/benchmark_extraction.py [--files 300] [--tests-per-file 40] [--workers N]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+
+# Run as a script, so the sibling module is importable directly
+from Extractor import TestCase_PageFunction_Extractor
+
+
+def write_synthetic_tree(test_case_dir, files, tests_per_file, seed=0):
+    rng = random.Random(seed)
+    tags = ['bft', 'media_room', 'timeline', 'export', 'title_designer']
+    actions = ['Open media room', 'Import media', 'Drag clip to timeline', 'Export project', 'Apply title']
+    for file_no in range(files):
+        lines = ["import pytest", "", f"class Test_Synthetic_{file_no}():"]
+        for test_no in range(tests_per_file):
+            test_name = f"test_synthetic_{file_no}_{test_no}"
+            lines.append(f"    @pytest.mark.{rng.choice(tags)}")
+            lines.append(f"    @pytest.mark.{rng.choice(tags)}")
+            lines.append(f"    @pytest.mark.name('[{test_name}] Synthetic case')")
+            lines.append(f"    def {test_name}(self):")
+            lines.append("        '''")
+            for step_no in range(rng.randint(2, 6)):
+                lines.append(f"        {step_no + 1}. {rng.choice(actions)}")
+            lines.append("        '''")
+            for _ in range(rng.randint(3, 10)):
+                lines.append(f"        with step('[Action] {rng.choice(actions)}'):")
+                lines.append(f"            main_page.click(L.main.button_{rng.randint(0, 99)})")
+                lines.append(f"            assert main_page.is_exist(L.main.item_{rng.randint(0, 99)})")
+            lines.append("")
+        with open(os.path.join(test_case_dir, f"test_synthetic_{file_no}.py"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+def synthetic_undocumented_file(tests=1000):
+    lines = ["import pytest", "", "class Test_Undocumented():"]
+    for test_no in range(tests):
+        lines.append("    @pytest.mark.bft")
+        lines.append(f"    def test_undocumented_{test_no}(self):")
+        lines.append("        # steps are in the test plan")
+        lines.append(f"        main_page.click(L.main.button_{test_no})")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run_extraction(path_settings, max_workers):
+    extractor = TestCase_PageFunction_Extractor(path_settings=path_settings)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        records = extractor.extract_process('test_case', use_cache=False, max_workers=max_workers)
+        seconds = time.perf_counter() - start
+    return records, seconds
+
+
+def _shift_spans(tests, line_offset):
+    return [dict(test, start_line=test["start_line"] + line_offset, end_line=test["end_line"] + line_offset) for test in tests]
+
+
+def _time_parser(analyze, samples):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        results = [analyze(content) for content in samples]
+        seconds = time.perf_counter() - start
+    return results, seconds
+
+
+def benchmark_parsers(test_case_dir, max_lines=50000):
+    extractor = TestCase_PageFunction_Extractor(path_settings={
+        'page_functions_dir': None,
+        'test_case_dir': None,
+        'page_functions_json': None,
+        'test_case_json': None,
+    }, max_lines=max_lines)
+    contents = []
+    for file_name in sorted(os.listdir(test_case_dir)):
+        with open(os.path.join(test_case_dir, file_name), "r", encoding="utf-8") as f:
+            contents.append(f.read())
+    # One big module: class bodies stay valid when files are simply appended
+    big_content = "\n".join(contents)
+
+    parsers = (("regex", lambda c: extractor._analyze_content_test_case_regex(extractor._limit_lines(c))),
+               ("ast", extractor._analyze_content_test_case))
+    per_file_ast = None
+    for label, samples in (("per file", contents), ("one file", [big_content]),
+                           ("no docstrings", [synthetic_undocumented_file()])):
+        results = {}
+        timings = {}
+        for name, analyze in parsers:
+            results[name], timings[name] = _time_parser(analyze, samples)
+        counts = {name: sum(len(tests) for tests in file_results) for name, file_results in results.items()}
+        lines = sum(content.count("\n") + 1 for content in samples)
+        print(f"Parsers, {label} ({lines} lines): regex {timings['regex']:.2f}s / {counts['regex']} tests, "
+              f"ast {timings['ast']:.2f}s / {counts['ast']} tests, "
+              f"ast/regex time {timings['ast'] / timings['regex']:.2f}x")
+
+        if label == "per file":
+            # Well-formed files: both parsers must produce identical records (full_code and spans included)
+            for file_no, (regex_tests, ast_tests) in enumerate(zip(results["regex"], results["ast"])):
+                if regex_tests != ast_tests:
+                    raise AssertionError(f"Parsers disagree on file {file_no}")
+            # The same records as they sit in the concatenated file
+            per_file_ast = []
+            line_offset = 0
+            for content, tests in zip(contents, results["ast"]):
+                per_file_ast.extend(_shift_spans(tests, line_offset))
+                line_offset += content.count("\n") + 1
+        elif label == "one file":
+            # The regex stops at max_lines; the ast parser must still see every test of the tree
+            if results["ast"][0] != per_file_ast:
+                raise AssertionError("ast parser misses tests of the concatenated file")
+        elif counts["regex"] or counts["ast"]:
+            # Tests need a docstring to be extracted; this case only measures how the regex backtracks
+            raise AssertionError(f"Undocumented tests extracted (regex {counts['regex']}, ast {counts['ast']})")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--files", type=int, default=300)
+    arg_parser.add_argument("--tests-per-file", type=int, default=40)
+    arg_parser.add_argument("--workers", type=int, default=None, help="pool size (default: one per CPU)")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_case_dir = os.path.join(tmp_dir, "test_case")
+        os.makedirs(test_case_dir)
+        write_synthetic_tree(test_case_dir, args.files, args.tests_per_file)
+        path_settings = {
+            'page_functions_dir': None,
+            'test_case_dir': test_case_dir,
+            'page_functions_json': os.path.join(tmp_dir, "page_functions.json"),
+            'test_case_json': os.path.join(tmp_dir, "test_cases_code.json"),
+        }
+        print(f"Synthetic tree: {args.files} files, {args.files * args.tests_per_file} tests, "
+              f"{os.cpu_count()} CPU(s)")
+
+        serial_records, serial_seconds = run_extraction(path_settings, max_workers=1)
+        print(f"  serial     {serial_seconds:6.2f}s")
+        os.remove(path_settings['test_case_json'])
+        pool_records, pool_seconds = run_extraction(path_settings, max_workers=args.workers)
+        print(f"  pool       {pool_seconds:6.2f}s  ({args.workers or os.cpu_count()} workers)")
+
+        if json.dumps(serial_records) != json.dumps(pool_records):
+            raise AssertionError("Serial and parallel extraction disagree on the synthetic tree")
+        print(f"Speedup: {serial_seconds / pool_seconds:.2f}x ({len(pool_records)} tests, identical output)")
+
+        benchmark_parsers(test_case_dir)
+
+
+if __name__ == "__main__":
+    main()
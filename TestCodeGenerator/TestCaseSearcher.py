@@ -1,6 +1,11 @@
 from _BasicTool.Searcher import SearchBase
+from _BasicTool.JsonJournal import JsonJournal
 
 class SearchTestCases(SearchBase):
+    def _load_data(self, filtered_path=None):
+        """Load test cases, including generated ones still in the JSON journal."""
+        return JsonJournal(self.json_path).load()
+
     def _get_descriptions(self):
         """Get descriptions for test cases."""
         return [" ".join(tc["description"]) if isinstance(tc["description"], list) else tc["description"] for tc in self.data]
@@ -9,3 +14,8 @@ class SearchTestCases(SearchBase):
         """Find relevant test cases using FAISS with cosine similarity filtering."""
         return self.extract_relevant_items(test_steps, debug_mode=debug_mode)
 
+
+
+    def extract_relevant_test_cases_batch(self, test_steps_list, debug_mode=False):
+        """Find relevant test cases for several test step strings with a single FAISS search."""
+        return self.extract_relevant_items_batch(test_steps_list, debug_mode=debug_mode)
@@ -4,11 +4,19 @@ parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_path)
 import re
 import textwrap
-import json
+import threading
 from _ChatAPIConnector.ChatAPIConnector import ChatAPIConnector
+from _ChatAPIConnector.CodeExtractor import extract_fenced_code
 from TestCasePageFunctionExtractor.Extractor import TestCase_PageFunction_Extractor
 from TestCodeGenerator.TestCaseSearcher import SearchTestCases
+from _BasicTool.JsonJournal import JsonJournal, atomic_write
+from _BasicTool.Searcher import load_searcher
+from _BasicTool.PromptBuilder import PromptBuilder, DEFAULT_TOKEN_BUDGET, trim_code_to_steps
 
+SYSTEM_ROLE_MSG = "You are a helpful AI that generates pytest test functions based on provided instructions."
+
+# Serializes read-modify-write of the pytest file between GenerateCase instances in one process (e.g. AgentService tasks)
+_pytest_file_lock = threading.Lock()
 
 
 class GenerateCase():
@@ -16,38 +24,56 @@ class GenerateCase():
         self.relevant_functions = relevant_functions
         self.test_case_json = path_settings['test_case_json']
         self.test_case_faiss = path_settings['test_case_faiss']
+        self.test_case_journal = JsonJournal(self.test_case_json)
         self.test_case_json_content = self._load_data()
         self.pytest_entire_file_path = os.path.join(path_settings['pytest_file_path'], path_settings['pytest_file_name'])
         self.template_content = self._load_template(os.path.join(path_settings['pytest_file_path'], path_settings['pytest_template_name']))
         self.chat_api_connector = ChatAPIConnector()
+        self.search_test_cases_obj = None
+        # Reference tests and page functions are packed into this many prompt tokens
+        self.prompt_builder = PromptBuilder(path_settings.get('prompt_token_budget', DEFAULT_TOKEN_BUDGET))
 
     def _load_data(self):
-        """Load data from JSON file."""
-        with open(self.test_case_json, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        """Load data from JSON file, including test cases still in its journal."""
+        return self.test_case_journal.load()
         
     def _load_template(self, template_path):
         """Load template from python file """
         with open(template_path, 'r', encoding='utf-8') as file:
             return file.read()
 
+    def _get_search_test_cases_obj(self):
+        """One SearchTestCases per GenerateCase, shared with the rest of the process while the JSON is unchanged."""
+        if self.search_test_cases_obj is None:
+            self.search_test_cases_obj = load_searcher(SearchTestCases, self.test_case_json, self.test_case_faiss)
+        return self.search_test_cases_obj
+
     def _search_similar_test_cases(self, test_steps):
-        relevant_test_cases = self.search_test_cases_obj.extract_relevant_test_cases(test_steps)
+        relevant_test_cases = self._get_search_test_cases_obj().extract_relevant_test_cases(test_steps)
         return relevant_test_cases
     
-    def _generate_prompts(self, test_name, test_steps):
-
-        # self.search_page_functions_obj = SearchPageFunctions(self.page_functions_json, self.page_functions_faiss, force_update=self.force_update)
-        self.search_test_cases_obj = SearchTestCases(self.test_case_json, self.test_case_faiss)
-
+    def _generate_prompts(self, test_name, test_steps, similar_tests=None):
+        """similar_tests: reference test cases already retrieved for test_steps, searched here if None."""
         # search similar test cases and page functions
-        similar_tests = self._search_similar_test_cases(test_steps)
+        if similar_tests is None:
+            similar_tests = self._search_similar_test_cases(test_steps)
         # self.relevant_functions = self._search_similar_functions(test_steps)
 
 
         if not similar_tests or not self.relevant_functions:
             return "❌ 沒有找到足夠的參考測試案例或 Page Functions，請提供更詳細的測試步驟！"
 
+        # Only the step blocks related to these test steps are worth their tokens
+        similar_tests = [
+            dict(test, full_code=trim_code_to_steps(test.get("full_code", ""), test_steps)) for test in similar_tests
+        ]
+        packed = self.prompt_builder.pack([
+            {"name": "similar_tests", "items": similar_tests},
+            {"name": "relevant_functions", "items": self.relevant_functions},
+        ], fixed_text=self._format_prompt(test_name, test_steps, [], []))
+        return self._format_prompt(test_name, test_steps, packed["similar_tests"], packed["relevant_functions"])
+
+    def _format_prompt(self, test_name, test_steps, similar_tests, relevant_functions):
         prompt = f"""
 Generate a complete pytest test function using the given test steps.
 - Include pytest.mark decorators and @exception_screenshot.
@@ -60,105 +86,145 @@ Generate a complete pytest test function using the given test steps.
 - If main_page.compare(), assert with comment metions similarity should > or < value.
 - In test code, only use "Page Functions" and assign a lower priority to main_page.exist() and main_page.click().
 - Refer to these test cases: {similar_tests}.
-- Use these Page Functions: {self.relevant_functions}.
+- Use these Page Functions: {relevant_functions}.
 - Test Name: {test_name}
 - Test Steps: {test_steps}
 """
         return prompt
     
-    def _ask_llm(self, prompt):
-        system_role_msg = "You are a helpful AI that generates pytest test functions based on provided instructions."
-        code = self.chat_api_connector.generate_chat_response(prompt, system_role_msg)
-
-        pattern = r'@pytest(.*?)```'
-        result = re.search(pattern, code, re.DOTALL)
+    def _extract_code(self, chunks):
+        """
+        The generated test function from an LLM response given as text chunks: the first fenced code block
+        containing @pytest (earlier blocks, e.g. a short example or shell commands, are skipped), from its
+        first @pytest on. Reading stops at that block's closing fence.
+        """
+        code = extract_fenced_code(chunks, accept=lambda block: '@pytest' in block)
+        return code[code.find('@pytest'):]
 
-        if result:
-            extracted_content = '@pytest' + result.group(1)
+    def _ask_llm(self, prompt):
+        # Streamed, so the test can be written as soon as its code block is closed
+        return self._extract_code(self.chat_api_connector.stream_chat_response(prompt, SYSTEM_ROLE_MSG))
+
+
+    def _rewrite_pytest_file(self):
+        """Regenerate the whole pytest file from the template and every stored test case."""
+        # Read back from disk rather than self.test_case_json_content, which misses tests saved by other GenerateCase objects
+        content = self.template_content + "".join(
+            f"\n\n    {test_case_content['full_code']}" for test_case_content in self.test_case_journal.load()
+        )
+        atomic_write(self.pytest_entire_file_path, content)
+
+    def _patch_pytest_file(self, code_changes):
+        """
+        Apply (old_full_code, new_full_code) changes to the pytest file without regenerating the other tests:
+        a changed test has its block replaced in place, a new one (old_full_code None) is appended.
+        Falls back to a full rewrite if the file is missing or a block is not found exactly once.
+        """
+        if not os.path.exists(self.pytest_entire_file_path):
+            return self._rewrite_pytest_file()
+        with open(self.pytest_entire_file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        for old_full_code, new_full_code in code_changes:
+            new_block = f"\n\n    {new_full_code}"
+            if old_full_code is None:
+                content += new_block
+                continue
+            old_block = f"\n\n    {old_full_code}"
+            start = content.find(old_block)
+            end = start + len(old_block)
+            if start < 0 or content.find(old_block, start + 1) >= 0 or (end < len(content) and content[end] != "\n"):
+                print("⚠️ Cannot locate the test in the pytest file, regenerating it")
+                return self._rewrite_pytest_file()
+            content = content[:start] + new_block + content[end:]
+        atomic_write(self.pytest_entire_file_path, content)
+
+    def _save_test_cases(self, updates):
+        """
+        Persist (test_case_content, old_full_code) updates: each record is journaled instead of rewriting
+        the test case JSON, and only the affected blocks of the pytest file are touched.
+        """
+        with _pytest_file_lock:
+            self.test_case_journal.upsert_many([test_case_content for test_case_content, _ in updates])
+            self._patch_pytest_file([(old_full_code, test_case_content['full_code']) for test_case_content, old_full_code in updates])
+
+    def _prepare_generated_test(self, test_name, code):
+        """
+        Merge generated code into the in-memory test cases without writing anything.
+        Returns the (test_case_content, old_full_code) updates for _save_test_cases, old_full_code being None for a new test.
+        """
+        # get mark list
+        new_gen_mark_list = []
+        for mark in re.findall(r'@pytest\.mark\.(.*?)\n', code):
+            if "name(" in mark: continue
+            new_gen_mark_list.append(mark)
+
+        # Save the generated code to test case code json file
+        prefix = '    '  # Four spaces
+
+        # Indent each line of the code with the defined prefix
+        indented_code = f'\n\n    @pytest.mark.generated_testing_case\n{textwrap.indent(code, prefix)}'
+
+        for test_case_content in self.test_case_json_content:
+            if test_name == test_case_content['name']:
+                old_mark_list = test_case_content['tags']
+                diff_mark_list = [mark for mark in old_mark_list if mark not in new_gen_mark_list]
+                full_mark_list = list(dict.fromkeys(old_mark_list + new_gen_mark_list))
+
+                if diff_mark_list:
+                    # Update the mark list
+                    test_case_content['tags'] = full_mark_list
+                    new_mark_string = "\n    ".join([
+                        f"@pytest.mark.{mark}" for mark in diff_mark_list
+                    ])
+                    indented_code = f'\n\n    @pytest.mark.generated_testing_case\n    {new_mark_string}\n{textwrap.indent(code, prefix)}'
+                else:
+                    indented_code = f'\n\n    @pytest.mark.generated_testing_case\n{textwrap.indent(code, prefix)}'
+
+                old_full_code = test_case_content['full_code']
+                test_case_content['full_code'] = indented_code
+                return [(test_case_content, old_full_code)]
         
-        return extracted_content
-
+        # for the case is not in the json file
+        test_patterns = re.findall(
+            r"((?:\s*@pytest\.mark\.[^\n]+\n\s*)+)(?:@[\w_]+\n\s*)*def (\w+)\(.*?\):\s+[\"']{3}([\s\S]+?)[\"']{3}\s*([\s\S]+?)(?=\n\s*@pytest\.mark|\Z)",
+            indented_code, re.DOTALL
+        )
+        if not test_patterns:
+            return []
+        
+        new_test_cases = []
+        for full_markers, test_name, description, test_content in test_patterns:
+            tags = re.findall(r"@pytest\.mark\.(\w+)", full_markers)
+            marked_name_match = re.search(r"@pytest\.mark\.name\('([^']+)'\)", full_markers)
+            marked_name = marked_name_match.group(1) if marked_name_match else test_name
+            if "name" in tags:
+                tags.remove("name")
+            description_list = [step.strip() for step in description.split("\n") if step.strip()]
+            test_content_cleaned = test_content.strip()
+            full_code = full_markers + f"def {test_name}(self):\n    '''{description}'''\n        " + test_content_cleaned
+            test_case_content = {
+                "name": test_name,
+                "tags": tags,
+                "marked_name": marked_name,
+                "description": description_list,
+                "full_code": indented_code
+            }
+            self.test_case_json_content.append(test_case_content)
+            new_test_cases.append((test_case_content, None))
+        return new_test_cases
 
     def _write_generated_test(self, test_name, code):
         try:
-            # get mark list
-            new_gen_mark_list = []
-            for mark in re.findall(r'@pytest\.mark\.(.*?)\n', code):
-                if "name(" in mark: continue
-                new_gen_mark_list.append(mark)
-
-            # Save the generated code to test case code json file
-            prefix = '    '  # Four spaces
-
-            # Indent each line of the code with the defined prefix
-            indented_code = f'\n\n    @pytest.mark.generated_testing_case\n{textwrap.indent(code, prefix)}'
-
-            for test_case_content in self.test_case_json_content:
-                if test_name == test_case_content['name']:
-                    old_mark_list = test_case_content['tags']
-                    diff_mark_list = [mark for mark in old_mark_list if mark not in new_gen_mark_list]
-                    full_mark_list = list(dict.fromkeys(old_mark_list + new_gen_mark_list))
-
-                    if diff_mark_list:
-                        # Update the mark list
-                        test_case_content['tags'] = full_mark_list
-                        new_mark_string = "\n    ".join([
-                            f"@pytest.mark.{mark}" for mark in diff_mark_list
-                        ])
-                        indented_code = f'\n\n    @pytest.mark.generated_testing_case\n    {new_mark_string}\n{textwrap.indent(code, prefix)}'
-                    else:
-                        indented_code = f'\n\n    @pytest.mark.generated_testing_case\n{textwrap.indent(code, prefix)}'
-
-                    test_case_content['full_code'] = indented_code
-
-                    # write back to json file
-                    with open(self.test_case_json, 'w', encoding='utf-8') as file:
-                        json.dump(self.test_case_json_content, file, indent=4, ensure_ascii=False)
-
-                    # write json file to python file
-                    with open(self.pytest_entire_file_path, 'w', encoding='utf-8') as f:
-                        f.write(self.template_content)
-                        for test_case_content in self.test_case_json_content:
-                            f.write(f"\n\n    {test_case_content['full_code']}")
-                    return True
-            
-            # for the case is not in the json file
-            test_patterns = re.findall(
-                r"((?:\s*@pytest\.mark\.[^\n]+\n\s*)+)(?:@[\w_]+\n\s*)*def (\w+)\(.*?\):\s+[\"']{3}([\s\S]+?)[\"']{3}\s*([\s\S]+?)(?=\n\s*@pytest\.mark|\Z)",
-                indented_code, re.DOTALL
-            )
-            if not test_patterns:
+            updates = self._prepare_generated_test(test_name, code)
+            if not updates:
                 print("❌ No test cases found. Please check file format.")
                 return []
-            
-            for full_markers, test_name, description, test_content in test_patterns:
-                tags = re.findall(r"@pytest\.mark\.(\w+)", full_markers)
-                marked_name_match = re.search(r"@pytest\.mark\.name\('([^']+)'\)", full_markers)
-                marked_name = marked_name_match.group(1) if marked_name_match else test_name
-                if "name" in tags:
-                    tags.remove("name")
-                description_list = [step.strip() for step in description.split("\n") if step.strip()]
-                test_content_cleaned = test_content.strip()
-                full_code = full_markers + f"def {test_name}(self):\n    '''{description}'''\n        " + test_content_cleaned
-                self.test_case_json_content.append({
-                    "name": test_name,
-                    "tags": tags,
-                    "marked_name": marked_name,
-                    "description": description_list,
-                    "full_code": indented_code
-                })
-
-            with open(self.test_case_json, 'w', encoding='utf-8') as file:
-                json.dump(self.test_case_json_content, file, indent=4, ensure_ascii=False)
-
-            # write json file to python file
-            with open(self.pytest_entire_file_path, 'w', encoding='utf-8') as f:
-                f.write(self.template_content)
-                for test_case_content in self.test_case_json_content:
-                    f.write(f"\n\n    {test_case_content['full_code']}")
 
+            # journal the new or changed test case and patch its block into the python file
+            self._save_test_cases(updates)
             return True
-        
+
         except Exception as e:
             print(f"Error writing to file: {e}")
             return False
@@ -171,6 +237,66 @@ Generate a complete pytest test function using the given test steps.
         # print(f'Generated code is:\n {generated_code}')
         return self._write_generated_test(test_name, generated_code)
 
+    def batch_generate_process(self, items, max_concurrency=5):
+        """
+        Generate many tests in one pass.
+        items: (test_name, test_steps) pairs
+        Similar test cases for all items are retrieved with one batched search, the LLM calls run concurrently
+        (at most max_concurrency in flight), and every generated test is saved with a single journal append
+        and a single pytest file write.
+        Returns one {"test_name", "success", "error"} per item, in order; a failed item does not stop the batch.
+        """
+        items = list(items)
+        results = [{"test_name": test_name, "success": False, "error": None} for test_name, _ in items]
+        if not items:
+            return results
+
+        similar_tests_list = self._get_search_test_cases_obj().extract_relevant_test_cases_batch(
+            [test_steps for _, test_steps in items]
+        )
+
+        prompts = []
+        prompt_positions = []
+        for position, ((test_name, test_steps), similar_tests) in enumerate(zip(items, similar_tests_list)):
+            if not similar_tests or not self.relevant_functions:
+                results[position]["error"] = "Not enough reference test cases or page functions found"
+                continue
+            prompts.append(self._generate_prompts(test_name, test_steps, similar_tests))
+            prompt_positions.append(position)
+
+        responses = self.chat_api_connector.map_chat_responses(
+            prompts, SYSTEM_ROLE_MSG, max_concurrency=max_concurrency, return_exceptions=True
+        )
+
+        updates = []
+        for position, response in zip(prompt_positions, responses):
+            test_name = items[position][0]
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                test_updates = self._prepare_generated_test(test_name, self._extract_code([response]))
+                if not test_updates:
+                    raise ValueError("No test cases found in the generated code")
+            except Exception as e:
+                results[position]["error"] = f"{type(e).__name__}: {e}"
+                print(f"❌ Failed to generate {test_name}: {results[position]['error']}")
+                continue
+            updates.extend(test_updates)
+            results[position]["success"] = True
+
+        if updates:
+            try:
+                self._save_test_cases(updates)
+            except Exception as e:
+                print(f"Error writing to file: {e}")
+                for result in results:
+                    if result["success"]:
+                        result["success"] = False
+                        result["error"] = f"{type(e).__name__}: {e}"
+
+        print(f"✅ Generated {sum(result['success'] for result in results)} of {len(items)} test case(s)")
+        return results
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+import json
+import numpy as np
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+from _BasicTool.Searcher import SearchBase
+
+class SearchHelpSections(SearchBase):
+    def _load_data(self, filtered_path=None):
+        """Flatten full_help_content.json into one row per help section."""
+        with open(self.json_path, 'r', encoding='utf-8') as file:
+            full_help_content = json.load(file)
+
+        sections = []
+        for block in full_help_content.get("blocks", []):
+            for section in block.get("sections", []):
+                sections.append({
+                    "block_title": block.get("block_title"),
+                    "heading": section.get("heading"),
+                    "summary": section.get("summary"),
+                    "file": section.get("file"),
+                })
+        return sections
+
+    def _get_descriptions(self):
+        """Get heading + summary for help sections."""
+        return [" ".join([section["heading"] or "", section["summary"] or ""]) for section in self.data]
+
+    def extract_sections_above_threshold(self, queries, threshold):
+        """
+        For every query return the help sections whose similarity reaches threshold, in section order.
+        All queries are encoded in one batch and scored with a single matrix product.
+        """
+        if not queries:
+            return []
+        similarity = self._get_similarity_matrix(self._encode_queries(list(queries)))
+
+        results = []
+        for similarity_row in similarity:
+            results.append([
+                dict(self.data[row_id], similarity=float(similarity_row[row_id]))
+                for row_id in (similarity_row >= threshold).nonzero()[0]
+            ])
+        return results
+
+
+class SearchPageFunctionDescriptions(SearchBase):
+    def __init__(self, json_path, faiss_path, force_update=False, model_name='paraphrase-MiniLM-L6-v2'):
+        super().__init__(json_path, faiss_path, force_update=force_update, model_name=model_name)
+        # Rows sharing the same description text share one id, so dedup can work on integers
+        self.unique_descriptions, self.description_ids = np.unique(np.array(self.descriptions, dtype=object), return_inverse=True)
+
+    def _get_descriptions(self):
+        """Get descriptions for page functions."""
+        return [func["description"] for func in self.data]
+
+    def extract_descriptions_above_threshold(self, queries, threshold):
+        """
+        Unique page function descriptions whose similarity to any query reaches threshold.
+        Ordered by query, then by row, matching a nested query/row scan.
+        """
+        if not queries:
+            return []
+        similarity = self._get_similarity_matrix(self._encode_queries(list(queries)))
+
+        # nonzero walks the matrix row-major: query by query, rows ascending
+        _, matched_rows = np.nonzero(similarity >= threshold)
+        matched_ids = self.description_ids[matched_rows]
+        _, first_positions = np.unique(matched_ids, return_index=True)
+        return [str(self.unique_descriptions[i]) for i in matched_ids[np.sort(first_positions)]]
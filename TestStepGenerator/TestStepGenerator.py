@@ -1,95 +1,73 @@
-from sentence_transformers import SentenceTransformer, util
-import json
 import os
 import sys
-import torch
 parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_path)
 
 from _ChatAPIConnector.ChatAPIConnector import ChatAPIConnector
+from TestStepGenerator.ReferenceSearcher import SearchHelpSections, SearchPageFunctionDescriptions
+from TestCodeGenerator.TestCaseSearcher import SearchTestCases
+from _BasicTool.PromptBuilder import PromptBuilder, DEFAULT_TOKEN_BUDGET
+from _BasicTool.Searcher import load_searcher
 class TestStepGenerator():
-    def __init__(self, test_case_json_file_path, page_function_json_file, full_help_content_json_file_path, current_status, desired_goal):
-        with open(full_help_content_json_file_path, "r", encoding="utf-8") as file:
-            self.full_help_content = json.load(file)
-
-        with open(page_function_json_file, 'r', encoding='utf-8') as file:
-            self.page_function_content = json.load(file)
+    def __init__(self, test_case_json_file_path, page_function_json_file, full_help_content_json_file_path, current_status, desired_goal,
+                 help_faiss_path=None, test_case_faiss_path=None, page_function_faiss_path=None, prompt_token_budget=DEFAULT_TOKEN_BUDGET):
+        # Help section embeddings are persisted next to the help JSON and only re-embedded when sections change
+        if help_faiss_path is None:
+            help_faiss_path = os.path.splitext(full_help_content_json_file_path)[0] + '.faiss'
+        self.help_searcher = load_searcher(SearchHelpSections, full_help_content_json_file_path, help_faiss_path, model_name='paraphrase-MiniLM-L6-v2')
+
+        # Kept apart from SearchPageFunctions' index because this one uses the paraphrase model
+        if page_function_faiss_path is None:
+            page_function_faiss_path = os.path.splitext(page_function_json_file)[0] + '.paraphrase-MiniLM-L6-v2.faiss'
+        self.page_function_searcher = load_searcher(SearchPageFunctionDescriptions, page_function_json_file, page_function_faiss_path)
 
         self.threshold = 0.5
-        with open(test_case_json_file_path, 'r', encoding='utf-8') as f:
-            self.test_cases_content = json.load(f)
-        
-        self.model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-        # self.model = SentenceTransformer('all-mpnet-base-v2')
+        # Same persisted test case index as SearchTestCases in GenerateCase
+        if test_case_faiss_path is None:
+            test_case_faiss_path = os.path.splitext(test_case_json_file_path)[0] + '.faiss'
+        self.test_case_searcher = load_searcher(SearchTestCases, test_case_json_file_path, test_case_faiss_path)
+
         self.chat_api_connector = ChatAPIConnector()
+        # Help sections, reference steps and page function descriptions are packed into this many prompt tokens
+        self.prompt_builder = PromptBuilder(prompt_token_budget)
 
         self.current_status = current_status
         self.desired_goal = desired_goal
 
-    def _get_related_func_in_help(self, query):
-        results = []
-        # Define your query sentence
-        # query = f"Current Status is: {self.current_status} and Desired Goal is: {self.desired_goal}"
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-
-        # Iterate over the JSON data to compute similarity scores
-        for block in self.full_help_content.get("blocks", []):
-            for section in block.get("sections", []):
-                combined_text = " ".join([section.get("heading", ""), section.get("summary", "")])
-                section_embedding = self.model.encode(combined_text, convert_to_tensor=True)
-                similarity = util.cos_sim(query_embedding, section_embedding).item()
-                if similarity >= self.threshold:
-                    results.append({
-                        "block_title": block.get("block_title"),
-                        "heading": section.get("heading"),
-                        "summary": section.get("summary"),
-                        "file": section.get("file"),
-                        "similarity": similarity
-                    })
-
+    def _get_related_func_in_help(self, queries):
+        """Help sections related to each query (with their similarity), searched for all queries in one batch."""
         refer_data_list = []
         refer_data_heading = []
-        # Print the results
-        for item in results:
-            refer_data_list.append(f"{item['heading']}: {item['summary']}")
-            refer_data_heading.append(item['heading'])
+        refer_data_similarity = []
+        for results in self.help_searcher.extract_sections_above_threshold(queries, self.threshold):
+            for item in results:
+                refer_data_list.append(f"{item['heading']}: {item['summary']}")
+                refer_data_heading.append(item['heading'])
+                refer_data_similarity.append(item['similarity'])
         
-        return refer_data_list, refer_data_heading
+        return refer_data_list, refer_data_heading, refer_data_similarity
 
     def _get_simliary_test_case(self):
         # 定義查詢條件
         query = f"{self.current_status}, {self.desired_goal}"
 
-        # 將每個測試案例的 name 與 description 合併成一個字串
-        test_case_texts = []
-        for tc in self.test_cases_content:
-            name = tc.get("name", "")
-            # 將 description 列表轉換成一個字串（以空格隔開）
-            desc = " ".join(tc.get("description", []))
-            full_text = f"{name}: {desc}"
-            test_case_texts.append(full_text)
-
-        # 編碼查詢與所有測試案例的文字
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-        tc_embeddings = self.model.encode(test_case_texts, convert_to_tensor=True)
-
-        # 計算查詢與每筆案例間的餘弦相似度
-        cosine_scores = util.cos_sim(query_embedding, tc_embeddings)[0]
-
         # 取得前10筆相似度最高的案例（若總數不足 10，則取全部）
-        top_k = min(10, len(test_case_texts))
-        top_results = torch.topk(cosine_scores, k=top_k)
-
-        # 輸出結果：依序印出 name、description 與相似度分數
         result = []
         result_name = []
-        for score, idx in zip(top_results.values, top_results.indices):
-            tc = self.test_cases_content[idx.item()]
+        for tc in self.test_case_searcher.extract_top_k_items(query, top_k=10):
             result.append(tc.get("description"))
             result_name.append(tc.get("name"))
         return result, result_name
     
-    def _get_prompt_for_generate_steps(self, refer_data_list, refer_test_steps_list):
+    def _get_prompt_for_generate_steps(self, refer_data_list, refer_test_steps_list, refer_data_similarity=None):
+        """Pack the most similar help sections and reference test steps into the prompt budget."""
+        packed = self.prompt_builder.pack([
+            {"name": "refer_data_list", "items": refer_data_list, "scores": refer_data_similarity},
+            {"name": "refer_test_steps_list", "items": refer_test_steps_list},
+        ], fixed_text=self._format_prompt_for_generate_steps([], []))
+        return self._format_prompt_for_generate_steps(packed["refer_data_list"], packed["refer_test_steps_list"])
+
+    def _format_prompt_for_generate_steps(self, refer_data_list, refer_test_steps_list):
         prompt = f'''Generate precise operation steps for PowerDirector software with the following requirements:
 - Each step must begin with an incremental number followed by [Action] or [Verify], e.g., "1. [Action]"
 - Present steps as a single, continuous numbered list (1, 2, 3, etc.), NOT grouped by function
@@ -130,32 +108,17 @@ Desired Goal: {self.desired_goal}'''
         return self.chat_api_connector.generate_chat_response(prompt, system_role_msg)
     
     def _get_related_page_functions_from_refer_data(self, refer_data_list, threshold=0.4):
-        # Generate embeddings for descriptions
-        descriptions = [item['description'] for item in self.page_function_content]
-        embeddings = self.model.encode(descriptions, convert_to_tensor=True)
-
-        unique_descriptions = set()  # Set to ensure unique descriptions
-        related_page_function_descriptions_list = []
-
-        # Iterate through the refer_data_list
-        for query in refer_data_list:
-            # Encode the query
-            query_embedding = self.model.encode([query], convert_to_tensor=True)
-            
-            # Calculate cosine similarity
-            cosine_scores = util.cos_sim(query_embedding, embeddings)[0]
-
-            # Iterate over cosine scores and add descriptions with scores above threshold
-            for idx, score in enumerate(cosine_scores):
-                if score >= threshold:  # Check if the similarity score meets the threshold
-                    most_similar_description = descriptions[idx]
-                    if most_similar_description not in unique_descriptions:
-                        unique_descriptions.add(most_similar_description)
-                        related_page_function_descriptions_list.append(most_similar_description)
-
-        return related_page_function_descriptions_list
+        # One batched encode of all headings against the cached description matrix
+        return self.page_function_searcher.extract_descriptions_above_threshold(refer_data_list, threshold)
     
     def _get_prompt_to_rewrite_test_step(self, raw_steps, refer_page_functions):
+        """Pack the page function descriptions (in match order) into the prompt budget."""
+        packed = self.prompt_builder.pack([
+            {"name": "refer_page_functions", "items": refer_page_functions},
+        ], fixed_text=self._format_prompt_to_rewrite_test_step(raw_steps, []))
+        return self._format_prompt_to_rewrite_test_step(raw_steps, packed["refer_page_functions"])
+
+    def _format_prompt_to_rewrite_test_step(self, raw_steps, refer_page_functions):
         prompt = f'''
 Your task is to align raw_steps with the functions provided in refer_page_functions as follows:
  - If a step in raw_steps corresponds exactly to a function in refer_page_functions, replace it with the format used in refer_page_functions.
@@ -177,23 +140,14 @@ refer_page_functions: {refer_page_functions}
         return self.chat_api_connector.generate_chat_response(prompt, system_role_msg)
     
     def generate_process(self):
-        refer_data_list = []
-        refer_data_heading = []
-        # Get Related Function in Help for Current Status
-        for query in self.current_status:
-            data_list, data_heading = self._get_related_func_in_help(query)
-            refer_data_list.extend(data_list)
-            refer_data_heading.extend(data_heading)
-        for query in self.desired_goal:
-            data_list, data_heading = self._get_related_func_in_help(query)
-            refer_data_list.extend(data_list)
-            refer_data_heading.extend(data_heading)
+        # Get Related Function in Help for Current Status and Desired Goal
+        refer_data_list, refer_data_heading, refer_data_similarity = self._get_related_func_in_help(list(self.current_status) + list(self.desired_goal))
         refer_test_steps_list, refer_test_name_list = self._get_simliary_test_case()
         related_page_function_descriptions_list = self._get_related_page_functions_from_refer_data(refer_data_heading)
 
         print(f'related_page_function_descriptions_list: {related_page_function_descriptions_list}')
 
-        prompt_to_gen_step = self._get_prompt_for_generate_steps(refer_data_list, refer_test_steps_list)
+        prompt_to_gen_step = self._get_prompt_for_generate_steps(refer_data_list, refer_test_steps_list, refer_data_similarity)
         generated_raw_steps = self._ask_llm_to_generate_steps(prompt_to_gen_step)
         print(f'generated_raw_steps:\n{generated_raw_steps}')
         prompt_to_rewrite_test_step = self._get_prompt_to_rewrite_test_step(generated_raw_steps, related_page_function_descriptions_list)
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+import threading
+
+def atomic_write(path, content):
+    """
+    Write content (str, or bytes for binary files) to path through a temp file in the same directory
+    and os.replace, so readers never see a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with (os.fdopen(fd, 'wb') if isinstance(content, bytes) else os.fdopen(fd, 'w', encoding='utf-8')) as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# One lock per JSON file, so writers sharing a process do not interleave an append with a compaction
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _get_lock(path):
+    path = os.path.abspath(path)
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+class JsonJournal():
+    """
+    A JSON list of records plus an append-only journal of upserts next to it (<json>.journal.jsonl).
+    Upserting one record appends one line instead of rewriting the whole JSON; after compact_every
+    entries the journal is folded back into the JSON with an atomic rewrite.
+    Readers should go through load() so they see the journaled records too.
+    """
+    def __init__(self, json_path, key='name', compact_every=50):
+        self.json_path = json_path
+        self.journal_path = os.path.splitext(json_path)[0] + '.journal.jsonl'
+        self.key = key
+        self.compact_every = compact_every
+        self._journal_length = None  # entries in the journal file, counted on first use
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn line from an interrupted append; the lines around it are intact
+                    continue
+        return entries
+
+    def signature(self):
+        """Changes whenever the JSON or its journal changes on disk."""
+        signature = []
+        for path in (self.json_path, self.journal_path):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            else:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self):
+        """The JSON records with the journaled upserts applied: changed records in place, new ones appended."""
+        with open(self.json_path, 'r', encoding='utf-8') as file:
+            records = json.load(file)
+
+        journal_entries = self._read_journal()
+        self._journal_length = len(journal_entries)
+        if journal_entries:
+            positions = {}
+            for i, record in enumerate(records):
+                positions.setdefault(record.get(self.key), i)
+            for record in journal_entries:
+                position = positions.get(record.get(self.key))
+                if position is None:
+                    positions[record.get(self.key)] = len(records)
+                    records.append(record)
+                else:
+                    records[position] = record
+        return records
+
+    def upsert(self, record):
+        """Journal one new or changed record."""
+        self.upsert_many([record])
+
+    def upsert_many(self, upserted_records):
+        """
+        Journal several records with a single append. Once the journal holds compact_every entries it is
+        folded into the JSON, starting from what is on disk so records journaled by other writers are kept.
+        """
+        if not upserted_records:
+            return
+        with _get_lock(self.json_path):
+            if self._journal_length is None:
+                self._journal_length = len(self._read_journal())
+            with open(self.journal_path, 'a+b') as file:
+                # Start on a fresh line if an earlier append was interrupted mid-line
+                if file.tell() > 0:
+                    file.seek(file.tell() - 1)
+                    if file.read(1) != b'\n':
+                        file.write(b'\n')
+                file.write("".join(json.dumps(record, ensure_ascii=False) + '\n' for record in upserted_records).encode('utf-8'))
+                file.flush()
+                os.fsync(file.fileno())
+            self._journal_length += len(upserted_records)
+
+            if self._journal_length >= self.compact_every:
+                self._compact(self.load())
+
+    def compact(self, records):
+        """Atomically rewrite the JSON with records and drop the journal."""
+        with _get_lock(self.json_path):
+            self._compact(records)
+
+    def _compact(self, records):
+        atomic_write(self.json_path, json.dumps(records, ensure_ascii=False, indent=4))
+        self.discard()
+
+    def discard(self):
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_length = 0
@@ -0,0 +1,35 @@
+import threading
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# One SentenceTransformer instance per model name for the whole process.
+_models = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name=DEFAULT_MODEL_NAME):
+    """Return the shared SentenceTransformer for model_name, loading it on first use."""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited for the lock.
+        model = _models.get(model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"[INFO] Loading embedding model: {model_name}")
+            model = SentenceTransformer(model_name)
+            _models[model_name] = model
+    return model
+
+
+def warm_up(model_names=(DEFAULT_MODEL_NAME,)):
+    """Load the given models ahead of time so the first tool call does not pay for it."""
+    for model_name in model_names:
+        get_model(model_name)
+
+
+def loaded_models():
+    """Names of the models currently resident in this process."""
+    return list(_models)
@@ -0,0 +1,185 @@
+import re
+import threading
+
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Characters per token when tiktoken is not installed; close to the average for English text and code
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+_lock = threading.Lock()
+
+def _get_encoding(model):
+    """tiktoken encoding for model, or None if tiktoken (or its encoding files) is unavailable."""
+    with _lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                encoding = None
+            _encodings[model] = encoding
+        return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Number of tokens text takes for model, counted locally."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_STEP_BLOCK_PATTERN = re.compile(r"^(\s*)with step\((['\"])(.*?)\2\)")
+_WORD_PATTERN = re.compile(r"[a-z0-9]{3,}")
+
+def _words(text):
+    return set(_WORD_PATTERN.findall(text.lower()))
+
+
+def trim_code_to_steps(code, test_steps, min_overlap=0.3):
+    """
+    Keep only the `with step(...)` blocks of a test whose step description shares at least min_overlap of
+    its words with test_steps. Decorators, the signature, the docstring and code outside step blocks are kept;
+    each run of dropped blocks becomes one '# ...' line. Code without step blocks is returned unchanged.
+    """
+    lines = code.split("\n")
+    query_words = _words(str(test_steps))
+
+    # Split into [lines, step description or None for code outside step blocks] segments
+    segments = []
+    i = 0
+    while i < len(lines):
+        match = _STEP_BLOCK_PATTERN.match(lines[i])
+        if not match:
+            if segments and segments[-1][1] is None:
+                segments[-1][0].append(lines[i])
+            else:
+                segments.append([[lines[i]], None])
+            i += 1
+            continue
+        indent = len(match.group(1))
+        end = i + 1
+        while end < len(lines) and (not lines[end].strip() or len(lines[end]) - len(lines[end].lstrip()) > indent):
+            end += 1
+        segments.append([lines[i:end], match.group(3)])
+        i = end
+
+    step_positions = [position for position, (_, description) in enumerate(segments) if description is not None]
+    if not step_positions:
+        return code
+
+    def is_relevant(description):
+        words = _words(description)
+        return bool(words) and len(words & query_words) / len(words) >= min_overlap
+
+    kept_positions = {position for position in step_positions if is_relevant(segments[position][1])}
+    if not kept_positions:
+        # Still show one step block, so the reference keeps its shape
+        kept_positions = {step_positions[0]}
+
+    trimmed_lines = []
+    dropping = False
+    for position, (segment_lines, description) in enumerate(segments):
+        if description is None or position in kept_positions:
+            trimmed_lines.extend(segment_lines)
+            dropping = False
+        elif not dropping:
+            indent = len(segment_lines[0]) - len(segment_lines[0].lstrip())
+            trimmed_lines.append(" " * indent + "# ...")
+            dropping = True
+    return "\n".join(trimmed_lines)
+
+
+class PromptBuilder():
+    """
+    Packs ranked context items into a prompt under a token budget.
+    The fixed part of the prompt is counted first. Each section then gets an equal split of what the
+    previous sections left over; tokens still unused after that go to the best dropped items, section by section.
+    """
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, model="gpt-4o", verbose=True):
+        self.token_budget = token_budget
+        self.model = model
+        self.verbose = verbose
+        self.last_report = None
+
+    def count_tokens(self, text):
+        return count_tokens(text, self.model)
+
+    def _rank_items(self, section):
+        """[(item index, token cost)] best first, without items rendering to the same text as a better one."""
+        items = section["items"]
+        render = section.get("render", repr)
+        scores = section.get("scores")
+        order = range(len(items))
+        if scores is not None:
+            order = sorted(order, key=lambda i: -scores[i])
+
+        ranked = []
+        seen_texts = set()
+        for i in order:
+            text = render(items[i])
+            if text in seen_texts:
+                continue
+            seen_texts.add(text)
+            # + 1 for the ', ' separator between items
+            ranked.append((i, self.count_tokens(text) + 1))
+        return ranked
+
+    def pack(self, sections, fixed_text=""):
+        """
+        sections: list of dicts with
+            "name":   key of the section in the result
+            "items":  context items, best first unless scores are given
+            "scores": optional similarity per item; items are ranked by it, highest first
+            "render": optional item -> text used for counting (default repr, as in an f-string of the list)
+        Returns {name: packed items}. Items keep their rank order; duplicates (same rendered text) are
+        dropped. The sizes of what was packed and dropped are in self.last_report.
+        """
+        fixed_tokens = self.count_tokens(fixed_text)
+        remaining = self.token_budget - fixed_tokens
+        sections = [dict(section, items=list(section["items"] or [])) for section in sections]
+        ranked_sections = [self._rank_items(section) for section in sections]
+        selected = [set() for _ in sections]
+
+        for position, ranked in enumerate(ranked_sections):
+            allowance = max(remaining, 0) // (len(sections) - position)
+            used = 0
+            for i, cost in ranked:
+                if used + cost <= allowance:
+                    selected[position].add(i)
+                    used += cost
+            remaining -= used
+
+        # Second pass: leftover tokens go to the best items that did not fit their section's share
+        for position, ranked in enumerate(ranked_sections):
+            for i, cost in ranked:
+                if i not in selected[position] and cost <= remaining:
+                    selected[position].add(i)
+                    remaining -= cost
+
+        packed_sections = {}
+        report = {"budget": self.token_budget, "fixed_tokens": fixed_tokens, "sections": {}}
+        for section, ranked, section_selected in zip(sections, ranked_sections, selected):
+            packed_costs = [cost for i, cost in ranked if i in section_selected]
+            dropped_costs = [cost for i, cost in ranked if i not in section_selected]
+            packed_sections[section["name"]] = [section["items"][i] for i, _ in ranked if i in section_selected]
+            report["sections"][section["name"]] = {
+                "packed_items": len(packed_costs),
+                "packed_tokens": sum(packed_costs),
+                "dropped_items": len(dropped_costs),
+                "dropped_tokens": sum(dropped_costs),
+            }
+        report["total_tokens"] = self.token_budget - remaining
+
+        self.last_report = report
+        if self.verbose:
+            summary = "; ".join(
+                f"{name}: packed {r['packed_items']} ({r['packed_tokens']} tok), dropped {r['dropped_items']} ({r['dropped_tokens']} tok)"
+                for name, r in report["sections"].items()
+            )
+            print(f"[PROMPT] ~{report['total_tokens']}/{self.token_budget} tokens, fixed {report['fixed_tokens']}; {summary}")
+        return packed_sections
@@ -1,14 +1,33 @@
 import json
+import hashlib
 import faiss
+import numpy as np
 import os
-from sentence_transformers import SentenceTransformer
+import threading
+from _BasicTool.ModelRegistry import DEFAULT_MODEL_NAME, get_model
+from _BasicTool.JsonJournal import JsonJournal
+
+# Largest k that _determine_top_k can return (10 + 2 for compound page function steps)
+MAX_ADAPTIVE_TOP_K = 12
+
+def _hash_text(text):
+    """Content hash of one indexed row, used to detect added/changed rows."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
 
 class SearchBase:
-    def __init__(self, json_path, faiss_path, force_update=False):
+    def __init__(self, json_path, faiss_path, force_update=False, model_name=DEFAULT_MODEL_NAME):
         self.json_path = json_path
         self.faiss_path = faiss_path
+        self.manifest_path = os.path.splitext(faiss_path)[0] + '.manifest.json'
+        self.model_name = model_name
         self.data = self._load_data()
-        self.index, self.model, self.descriptions = self._load_or_build_faiss_index(force_update)
+        self.index, self.descriptions = self._load_or_build_faiss_index(force_update)
+        self._embedding_matrix = None
+
+    @property
+    def model(self):
+        """Shared embedding model, only loaded once something actually needs encoding."""
+        return get_model(self.model_name)
 
     def _load_data(self, filtered_path=None):
         """Load data from JSON file."""
@@ -20,28 +39,98 @@ class SearchBase:
         with open(json_path, 'r', encoding='utf-8') as file:
             return json.load(file)
 
+    def _read_manifest(self):
+        """Read the manifest stored next to the FAISS file, None if missing or unreadable."""
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.decoder.JSONDecodeError) as e:
+            print(f"[WARN] Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return None
+
+    def _write_index(self, index, row_hashes):
+        """Persist the FAISS index together with its manifest."""
+        faiss.write_index(index, self.faiss_path)
+        manifest = {
+            "model_name": self.model_name,
+            "dimension": index.d,
+            "row_hashes": row_hashes,
+        }
+        with open(self.manifest_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+
+    def _encode_rows(self, texts):
+        """Encode texts into L2-normalized float32 vectors."""
+        embeddings = self.model.encode(texts, convert_to_numpy=True).astype('float32')
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def _build_index(self, descriptions, row_hashes):
+        print(f"[INFO] Building FAISS index and saving to {self.faiss_path}")
+        embeddings = self._encode_rows(descriptions)
+        index = faiss.IndexFlatIP(embeddings.shape[1])
+        index.add(embeddings)
+        self._write_index(index, row_hashes)
+        return index
+
+    def _update_index(self, index, manifest, descriptions, row_hashes):
+        """Rebuild the index reusing stored vectors, only encoding rows that were added or changed."""
+        stored_vectors = index.reconstruct_n(0, index.ntotal)
+        vector_by_hash = {}
+        for row_id, row_hash in enumerate(manifest["row_hashes"]):
+            vector_by_hash.setdefault(row_hash, stored_vectors[row_id])
+
+        missing_rows = [i for i, row_hash in enumerate(row_hashes) if row_hash not in vector_by_hash]
+        print(f"[INFO] FAISS index {self.faiss_path} is stale, re-embedding {len(missing_rows)} of {len(row_hashes)} rows")
+        if missing_rows:
+            new_vectors = self._encode_rows([descriptions[i] for i in missing_rows])
+            for i, vector in zip(missing_rows, new_vectors):
+                vector_by_hash[row_hashes[i]] = vector
+
+        embeddings = np.stack([vector_by_hash[row_hash] for row_hash in row_hashes]).astype('float32')
+        new_index = faiss.IndexFlatIP(index.d)
+        new_index.add(embeddings)
+        self._write_index(new_index, row_hashes)
+        return new_index
+
     def _load_or_build_faiss_index(self, force_update):
-        """Load FAISS index from file if exists, otherwise build and save."""
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        """Load FAISS index from file if it matches its manifest, otherwise update or rebuild and save."""
         descriptions = self._get_descriptions()
         descriptions = [" ".join(desc) if isinstance(desc, list) else desc for desc in descriptions]
         
         if not descriptions:
             raise ValueError("No valid descriptions found!")
-        
-        if os.path.exists(self.faiss_path) and not force_update:
+
+        row_hashes = [_hash_text(desc) for desc in descriptions]
+        manifest = None if force_update else self._read_manifest()
+
+        if not manifest or not os.path.exists(self.faiss_path):
+            return self._build_index(descriptions, row_hashes), descriptions
+
+        index = faiss.read_index(self.faiss_path)
+        if (manifest.get("model_name") != self.model_name
+                or manifest.get("dimension") != index.d
+                or len(manifest.get("row_hashes", [])) != index.ntotal):
+            print(f"[INFO] Manifest does not match {self.faiss_path}")
+            return self._build_index(descriptions, row_hashes), descriptions
+
+        if manifest["row_hashes"] == row_hashes:
             print(f"[INFO] Loading FAISS index from {self.faiss_path}")
-            index = faiss.read_index(self.faiss_path)
-        else:
-            print(f"[INFO] Building FAISS index and saving to {self.faiss_path}")
-            embeddings = model.encode(descriptions, convert_to_numpy=True)
-            dimension = embeddings.shape[1]
-            index = faiss.IndexFlatIP(dimension)
-            faiss.normalize_L2(embeddings)
-            index.add(embeddings)
-            faiss.write_index(index, self.faiss_path)
-        
-        return index, model, descriptions
+            return index, descriptions
+
+        return self._update_index(index, manifest, descriptions, row_hashes), descriptions
+
+    def get_embedding_matrix(self):
+        """Normalized (rows, dim) matrix of the indexed vectors, reconstructed from the index once."""
+        if self._embedding_matrix is None:
+            self._embedding_matrix = self.index.reconstruct_n(0, self.index.ntotal)
+        return self._embedding_matrix
+
+    def _get_similarity_matrix(self, query_embeddings):
+        """Cosine similarity of each normalized query against every indexed row, shape (queries, rows)."""
+        return query_embeddings @ self.get_embedding_matrix().T
 
     def _get_descriptions(self):
         """Extract descriptions from data, implemented in subclasses."""
@@ -58,19 +147,29 @@ class SearchBase:
         
         return top_k
 
-    def extract_relevant_items(self, query, top_k=10, debug_mode=False, is_page_function=False):
-        """Find relevant items using FAISS with cosine similarity filtering."""
+    def _encode_queries(self, queries):
+        """Encode queries into L2-normalized float32 vectors, one row per query."""
+        query_embeddings = self.model.encode(queries, convert_to_numpy=True).astype('float32')
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
+
+    def _search_candidates(self, query_embeddings, top_k, search_params=None):
+        """Run one FAISS search deep enough to cover any k that _determine_top_k can choose."""
+        depth = max(top_k, MAX_ADAPTIVE_TOP_K)
+        if search_params is None:
+            return self.index.search(query_embeddings, depth)
+        return self.index.search(query_embeddings, depth, params=search_params)
+
+    def _collect_relevant_items(self, query, distances, indices, top_k, debug_mode, is_page_function):
+        """Apply adaptive top_k and similarity filtering to one query's candidate row."""
         relevant_items = []
         seen_items = set()
 
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(query_embedding)
-        distances, indices = self.index.search(query_embedding, top_k)
-
-        max_similarity = max(distances[0]) if len(distances[0]) > 0 else 0
-        descriptions = [self.descriptions[i] for i in indices[0] if i >= 0 and i < len(self.data)]
+        # The first top_k candidates give the same max_similarity as a separate top_k search
+        max_similarity = max(distances[:top_k]) if len(distances) > 0 else 0
+        descriptions = [self.descriptions[i] for i in indices[:top_k] if i >= 0 and i < len(self.data)]
         top_k = self._determine_top_k(max_similarity, descriptions, is_page_function)
-        distances, indices = self.index.search(query_embedding, top_k)
+        distances, indices = distances[:top_k], indices[:top_k]
 
         if is_page_function:
             similarity_threshold = 0.4
@@ -79,12 +178,12 @@ class SearchBase:
 
         if debug_mode:
             print(f"\n[DEBUG] Query: {query}, Adjusted top_k: {top_k}")
-            for i, dist in zip(indices[0], distances[0]):
+            for i, dist in zip(indices, distances):
                 if i >= 0 and i < len(self.data):
                     print(f"  - {self.data[i]['name']} (Similarity: {dist:.4f})")
             return []
 
-        for i, dist in zip(indices[0], distances[0]):
+        for i, dist in zip(indices, distances):
             if dist < similarity_threshold:
                 continue
             if i >= 0 and i < len(self.data):
@@ -104,4 +203,63 @@ class SearchBase:
                             "description": item_data.get("description", []),
                             "full_code": item_data.get("full_code", "")
                     })
-        return relevant_items if relevant_items else None
\ No newline at end of file
+        return relevant_items if relevant_items else None
+
+    def extract_relevant_items(self, query, top_k=10, debug_mode=False, is_page_function=False, search_params=None, query_embedding=None):
+        """
+        Find relevant items using FAISS with cosine similarity filtering.
+        search_params: optional faiss.SearchParameters, e.g. an ID selector restricting the rows searched
+        query_embedding: optional pre-encoded (1, dim) query, skips encoding the query again
+        """
+        if query_embedding is None:
+            query_embedding = self._encode_queries([query])
+        distances, indices = self._search_candidates(query_embedding, top_k, search_params)
+        return self._collect_relevant_items(query, distances[0], indices[0], top_k, debug_mode, is_page_function)
+
+    def extract_top_k_items(self, query, top_k=10):
+        """Plain nearest-neighbour lookup: the top_k data rows for query, best first."""
+        top_k = min(top_k, self.index.ntotal)
+        _, indices = self.index.search(self._encode_queries([query]), top_k)
+        return [self.data[i] for i in indices[0] if i >= 0 and i < len(self.data)]
+
+    def extract_relevant_items_batch(self, queries, top_k=10, debug_mode=False, is_page_function=False, search_params=None):
+        """Batch version of extract_relevant_items: one encode and one FAISS search for all queries."""
+        if not queries:
+            return []
+        query_embeddings = self._encode_queries(list(queries))
+        distances, indices = self._search_candidates(query_embeddings, top_k, search_params)
+        return [
+            self._collect_relevant_items(query, distances[row], indices[row], top_k, debug_mode, is_page_function)
+            for row, query in enumerate(queries)
+        ]
+
+
+# One searcher per (class, files, options) for the whole process, rebuilt when its JSON changes on disk
+_searchers = {}
+_searcher_locks = {}
+_searchers_lock = threading.Lock()
+
+def load_searcher(searcher_class, json_path, faiss_path, *args, **kwargs):
+    """
+    Return the shared searcher_class(json_path, faiss_path, *args, **kwargs), constructing it again only if
+    the JSON or its journal changed since it was built. Searching does not modify a searcher, so threads can share it.
+    """
+    key = (searcher_class, os.path.abspath(json_path), os.path.abspath(faiss_path), args, tuple(sorted(kwargs.items())))
+    signature = JsonJournal(json_path).signature()
+
+    with _searchers_lock:
+        cached = _searchers.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+        key_lock = _searcher_locks.setdefault(key, threading.Lock())
+
+    # Building can encode rows and write the FAISS file: only callers of the same searcher wait for it
+    with key_lock:
+        cached = _searchers.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        searcher = searcher_class(json_path, faiss_path, *args, **kwargs)
+        with _searchers_lock:
+            _searchers[key] = (signature, searcher)
+        return searcher
@@ -0,0 +1,67 @@
+import os
+import threading
+from _BasicTool.JsonJournal import JsonJournal
+
+class RecordIndex():
+    """O(1) name -> record lookups over a list of JSON records. The first record wins on duplicate names."""
+    def __init__(self, records, key):
+        self.records = records
+        self.key = key
+        self._records_by_key = {}
+        for record in records:
+            self._records_by_key.setdefault(record.get(key), record)
+
+    def get(self, name, default=None):
+        return self._records_by_key.get(name, default)
+
+    def __contains__(self, name):
+        return name in self._records_by_key
+
+    def __len__(self):
+        return len(self.records)
+
+
+class TestCaseRepository(RecordIndex):
+    """Test cases from test_cases_code.json (plus its journal of generated tests), indexed by test name."""
+    def __init__(self, json_path):
+        self.json_path = json_path
+        super().__init__(JsonJournal(json_path).load(), 'name')
+
+    def get_full_code(self, name):
+        record = self.get(name)
+        return record["full_code"] if record else None
+
+    def get_tags(self, name):
+        record = self.get(name)
+        return record.get("tags", []) if record else None
+
+    def get_description(self, name):
+        record = self.get(name)
+        return record.get("description", []) if record else None
+
+
+class TestLogRepository(RecordIndex):
+    """Test log records from FailLogCollector, indexed by test name."""
+    def __init__(self, records):
+        super().__init__(records, 'test_name')
+
+
+# One repository per JSON file for the whole process, reloaded when the file changes on disk
+_repositories = {}
+_lock = threading.Lock()
+
+def load_test_case_repository(json_path):
+    """Return the shared TestCaseRepository for json_path, re-reading it only if the file or its journal changed."""
+    json_path = os.path.abspath(json_path)
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(json_path)
+    signature = JsonJournal(json_path).signature()
+
+    with _lock:
+        cached = _repositories.get(json_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        repository = TestCaseRepository(json_path)
+        _repositories[json_path] = (signature, repository)
+        return repository
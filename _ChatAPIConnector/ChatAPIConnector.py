@@ -1,15 +1,60 @@
- 
-import openai
+import asyncio
 import base64
+import hashlib
 import os
+import sys
+import random
 import configparser
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+from _ChatAPIConnector.ResponseCache import ResponseCache
+
+
+def _import_openai():
+    # Imported on first use, so the connector works with an injected client where openai is not installed
+    import openai
+    return openai
+
+
+def default_retryable_errors():
+    """Errors worth retrying with backoff instead of failing the request; none without openai."""
+    try:
+        openai = _import_openai()
+    except ImportError:
+        return ()
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)
+
 
 class ChatAPIConnector():
-    def __init__(self):
-        self.api_key = self._get_api_key()
-        self.client = openai.OpenAI(api_key=self.api_key)
+    def __init__(self, cache=None, client=None, async_client=None, max_retries=5, backoff_seconds=1.0, retryable_errors=None,
+                 api_key=None):
+        """
+        cache: optional ResponseCache; if None and app.config is read, one is opened at LLM_CACHE_PATH when that value is set
+        client: optional OpenAI-compatible client (e.g. a local stub)
+        api_key: optional API key for the default clients
+        app.config is only read when neither a client nor an API key is passed in
+        async_client: optional AsyncOpenAI-compatible client used by the async API
+        max_retries, backoff_seconds: retry policy of the async API on rate limits and transient errors
+        retryable_errors: exception types that are retried (default: openai's rate limit, timeout and connection errors)
+        """
+        self.api_key = api_key
+        self.config = self._read_config() if client is None and api_key is None else None
+        if client is None:
+            client = _import_openai().OpenAI(api_key=self._get_api_key())
+        self.client = client
+        self.async_client = async_client
+        self._default_async_client = None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.retryable_errors = default_retryable_errors() if retryable_errors is None else tuple(retryable_errors)
 
-    def _get_api_key(self):
+        if cache is None and self.config is not None:
+            cache_path = self.config.get('General', 'LLM_CACHE_PATH', fallback='')
+            if cache_path:
+                cache = ResponseCache(cache_path)
+        self.cache = cache
+
+    def _read_config(self):
         CONFIG_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app.config"))
         if not os.path.exists(CONFIG_FILE):
             raise FileNotFoundError(f"Config file '{CONFIG_FILE}' not found.")
@@ -18,13 +63,27 @@ class ChatAPIConnector():
         config = configparser.ConfigParser()
         config.optionxform = lambda option: option  # preserve case
         config.read(CONFIG_FILE)
-        return config.get('General', 'API_KEY')
+        return config
+
+    def _get_api_key(self):
+        if self.api_key is None:
+            # An injected client without a key: the async API still needs one for its default client
+            if self.config is None:
+                self.config = self._read_config()
+            self.api_key = self.config.get('General', 'API_KEY')
+        return self.api_key
 
     def _encode_image(self, image_path):
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode("utf-8")
-    
-    def generate_chat_response(self, prompt, system_role_msg, image_path=None, model="gpt-4o"):
+
+    def _hash_image(self, image_path):
+        if not image_path:
+            return None
+        with open(image_path, "rb") as image_file:
+            return hashlib.sha256(image_file.read()).hexdigest()
+
+    def _build_messages(self, prompt, system_role_msg, image_path=None):
         messages=[
             {"role": "system", "content": system_role_msg},
             {"role": "user", "content": prompt}
@@ -34,15 +93,154 @@ class ChatAPIConnector():
             print(image_path)
             image_base64 = self._encode_image(image_path)
             messages.append({"role": "user", "content": "Here is the screenshot for reference.", "image_url": f"data:image/png;base64,{image_base64}"})
+        return messages
+
+    def _get_cache_key(self, prompt, system_role_msg, image_path, model, use_cache):
+        if self.cache is None or not use_cache:
+            return None
+        return ResponseCache.make_key(model, system_role_msg, prompt, self._hash_image(image_path))
+
+    def generate_chat_response(self, prompt, system_role_msg, image_path=None, model="gpt-4o", use_cache=True):
+        cache_key = self._get_cache_key(prompt, system_role_msg, image_path, model, use_cache)
+        if cache_key is not None:
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
+        messages = self._build_messages(prompt, system_role_msg, image_path)
 
         response = self.client.chat.completions.create(
-                model="gpt-4o",
+                model=model,
                 messages=messages,
                 temperature=0.7  # Adjust for randomness
             )
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+
+        if cache_key is not None and content is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    def stream_chat_response(self, prompt, system_role_msg, image_path=None, model="gpt-4o", use_cache=True):
+        """
+        Yield the response text chunk by chunk as the model produces it.
+        A cache hit is yielded as a single chunk. Only a response read to the end is cached: if the caller
+        stops early (e.g. once it has the code it needs), the request is closed and nothing is stored.
+        """
+        cache_key = self._get_cache_key(prompt, system_role_msg, image_path, model, use_cache)
+        if cache_key is not None:
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                yield cached_response
+                return
+
+        messages = self._build_messages(prompt, system_role_msg, image_path)
+
+        stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,  # Adjust for randomness
+                stream=True
+            )
+        content_parts = []
+        completed = False
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    content_parts.append(delta)
+                    yield delta
+            completed = True
+        finally:
+            if not completed and hasattr(stream, "close"):
+                stream.close()
+
+        if cache_key is not None and content_parts:
+            self.cache.put(cache_key, "".join(content_parts))
+
+    def _get_async_client(self):
+        if self.async_client is not None:
+            return self.async_client
+        if self._default_async_client is None:
+            self._default_async_client = _import_openai().AsyncOpenAI(api_key=self._get_api_key())
+        return self._default_async_client
+
+    async def agenerate_chat_response(self, prompt, system_role_msg, image_path=None, model="gpt-4o", use_cache=True, async_client=None):
+        """Async generate_chat_response; retries rate limits and transient errors with exponential backoff."""
+        cache_key = self._get_cache_key(prompt, system_role_msg, image_path, model, use_cache)
+        if cache_key is not None:
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
+        if async_client is None:
+            async_client = self._get_async_client()
+        messages = self._build_messages(prompt, system_role_msg, image_path)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await async_client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=0.7  # Adjust for randomness
+                    )
+                break
+            except self.retryable_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                print(f"[WARN] {type(e).__name__} from chat API, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+        content = response.choices[0].message.content
+
+        if cache_key is not None and content is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    async def amap_chat_responses(self, prompts, system_role_msg, max_concurrency=5, image_paths=None, model="gpt-4o",
+                                  use_cache=True, return_exceptions=False, async_client=None):
+        """
+        Run many prompts with at most max_concurrency requests in flight.
+        Results are returned in the order of prompts. With return_exceptions=True a failed prompt yields
+        its exception instead of aborting the whole batch.
+        """
+        if image_paths is None:
+            image_paths = [None] * len(prompts)
+        elif len(image_paths) != len(prompts):
+            raise ValueError(f"Got {len(image_paths)} image paths for {len(prompts)} prompts")
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(prompt, image_path):
+            async with semaphore:
+                return await self.agenerate_chat_response(prompt, system_role_msg, image_path=image_path, model=model,
+                                                          use_cache=use_cache, async_client=async_client)
+
+        return await asyncio.gather(
+            *(run_one(prompt, image_path) for prompt, image_path in zip(prompts, image_paths)),
+            return_exceptions=return_exceptions
+        )
+
+    def map_chat_responses(self, prompts, system_role_msg, max_concurrency=5, **kwargs):
+        """Blocking wrapper around amap_chat_responses for callers that are not async themselves."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("map_chat_responses cannot block inside a running event loop; await amap_chat_responses instead")
+
+        async def run():
+            # A default AsyncOpenAI client is tied to the event loop it first ran on, so use a fresh one per run
+            async_client = self.async_client or _import_openai().AsyncOpenAI(api_key=self._get_api_key())
+            try:
+                return await self.amap_chat_responses(prompts, system_role_msg, max_concurrency,
+                                                      async_client=async_client, **kwargs)
+            finally:
+                if async_client is not self.async_client:
+                    await async_client.close()
+
+        return asyncio.run(run())
 
 if __name__ == "__main__":
     chat_api = ChatAPIConnector()
     response = chat_api.generate_chat_response("How do I reset my password?", "You can reset your password by following these steps:")
-    print(response)
\ No newline at end of file
+    print(response)
@@ -0,0 +1,102 @@
+FENCE = "```"
+
+class FencedCodeExtractor():
+    """
+    Pulls the first fenced code block (```lang ... ```) out of text that arrives in chunks.
+    Only backticks starting a line (after optional indentation) are fences, so ``` inside prose or a
+    string literal does not open or close a block.
+    Every chunk is scanned once; feed() returns True as soon as the closing fence has arrived,
+    so the caller can stop reading the rest of the response. skip_block() drops that block and
+    moves on to the next one.
+    """
+    def __init__(self, max_preamble_chars=4000):
+        """max_preamble_chars: give up if no opening fence shows up within this many characters (after the previous block)"""
+        self.max_preamble_chars = max_preamble_chars
+        self.buffer = ""
+        self.code_start = None
+        self.code = None
+        self.skipped_blocks = 0
+        self._scan_pos = 0
+        self._preamble_start = 0
+        self._code_end = None
+
+    def _find_fence(self, start):
+        """Index of the first fence at or after start that begins a line, -1 if none is buffered yet."""
+        fence = self.buffer.find(FENCE, start)
+        while fence >= 0:
+            line_start = self.buffer.rfind("\n", 0, fence) + 1
+            if not self.buffer[line_start:fence].strip():
+                return fence
+            fence = self.buffer.find(FENCE, fence + 1)
+        return -1
+
+    @property
+    def done(self):
+        return self.code is not None
+
+    def feed(self, chunk):
+        if self.code is not None:
+            return True
+        self.buffer += chunk
+
+        if self.code_start is None:
+            fence = self._find_fence(self._scan_pos)
+            if fence < 0:
+                if len(self.buffer) - self._preamble_start > self.max_preamble_chars:
+                    raise ValueError(f"No code block in the first {self.max_preamble_chars} characters of the LLM response")
+                # A fence may be split across chunks
+                self._scan_pos = max(len(self.buffer) - len(FENCE) + 1, self._preamble_start)
+                return False
+            line_end = self.buffer.find("\n", fence + len(FENCE))
+            if line_end < 0:
+                # The language tag line is not complete yet
+                self._scan_pos = fence
+                return False
+            self.code_start = line_end + 1
+            self._scan_pos = self.code_start
+
+        fence = self._find_fence(self._scan_pos)
+        if fence < 0:
+            self._scan_pos = max(len(self.buffer) - len(FENCE) + 1, self.code_start)
+            return False
+        self.code = self.buffer[self.code_start:fence]
+        self._code_end = fence + len(FENCE)
+        return True
+
+    def skip_block(self):
+        """Drop the block just found and look for the next one; call feed("") to scan text already buffered."""
+        self.skipped_blocks += 1
+        self.code = None
+        self.code_start = None
+        self._scan_pos = self._preamble_start = self._code_end
+
+    def finish(self):
+        """The extracted code; raises ValueError if the text ended before a complete code block."""
+        if self.code is not None:
+            return self.code
+        if self.code_start is None:
+            if self.skipped_blocks:
+                raise ValueError(f"None of the {self.skipped_blocks} code block(s) in the LLM response was accepted")
+            raise ValueError("No code block found in the LLM response")
+        raise ValueError("The code block in the LLM response was not closed")
+
+
+def extract_fenced_code(chunks, max_preamble_chars=4000, accept=None):
+    """
+    First fenced code block from an iterable of text chunks (e.g. a streamed LLM response).
+    accept: optional code -> bool; blocks it rejects are skipped and reading goes on to the next one.
+    Stops consuming chunks, and closes a generator, once an accepted block's closing fence has arrived.
+    """
+    extractor = FencedCodeExtractor(max_preamble_chars)
+    try:
+        for chunk in chunks:
+            found = extractor.feed(chunk)
+            while found and accept is not None and not accept(extractor.code):
+                extractor.skip_block()
+                found = extractor.feed("")
+            if found:
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return extractor.finish()
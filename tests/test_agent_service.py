@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+import pytest
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+# Agents builds its tools with langchain
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_openai")
+import Agents
+import AgentService
+
+
+class StubAgent():
+    """Stands in for the LangChain agent: writes a TEMP file through Agents._temp_path and answers with its path."""
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def run(self, task_input):
+        self.release.wait(timeout=10)
+        if task_input == "boom":
+            raise RuntimeError("agent failed")
+        temp_path = Agents._temp_path("TEMP_FAIL_CASES.json")
+        Agents._save_to_json(task_input, temp_path)
+        return {"temp_path": temp_path, "content": Agents._read_from_json(temp_path)}
+
+
+@pytest.fixture
+def stub_agent(monkeypatch):
+    agent = StubAgent()
+    monkeypatch.setattr(Agents, "setup_agent", lambda: agent)
+    monkeypatch.setattr(Agents, "load_resources", lambda: None)
+    return agent
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def make(**kwargs):
+        services.append(AgentService.AgentService(**kwargs))
+        return services[-1]
+
+    yield make
+    for service in services:
+        shutil.rmtree(service.work_dir, ignore_errors=True)
+
+
+def wait_for(service, task_id, statuses=("done", "failed")):
+    for _ in range(500):
+        task = service.get_task(task_id)
+        if task["status"] in statuses:
+            return task
+        threading.Event().wait(0.01)
+    raise AssertionError(f"task {task_id} stuck in {task['status']}")
+
+
+def test_task_goes_from_queued_to_running_to_done(stub_agent, make_service):
+    service = make_service(workers=1, keep_task_dirs=True)
+    stub_agent.release.clear()
+    task = service.submit("write a test")
+    assert task["status"] == "queued"
+    assert task["started_at"] is None
+
+    service.start()
+    running = wait_for(service, task["task_id"], ("running",))
+    assert running["started_at"] is not None
+    assert service.health()["running"] == 1
+
+    stub_agent.release.set()
+    done = wait_for(service, task["task_id"])
+    assert done["status"] == "done"
+    assert done["error"] is None
+    assert done["finished_at"] >= done["started_at"]
+    assert done["result"]["content"] == "write a test"
+    assert service.get_task("unknown") is None
+
+
+def test_failed_agent_run_marks_the_task_failed(stub_agent, make_service):
+    service = make_service(workers=1)
+    service.start()
+    task = wait_for(service, service.submit("boom")["task_id"])
+    assert task["status"] == "failed"
+    assert task["error"] == "RuntimeError: agent failed"
+    assert task["result"] is None
+
+
+def test_task_workspace_routes_temp_files_to_the_task_directory(stub_agent, make_service):
+    service = make_service(workers=2, keep_task_dirs=True)
+    service.start()
+    tasks = [wait_for(service, service.submit(f"task {i}")["task_id"]) for i in range(3)]
+    for i, task in enumerate(tasks):
+        temp_path = task["result"]["temp_path"]
+        assert temp_path == os.path.join(service.work_dir, task["task_id"], "TEMP_FAIL_CASES.json")
+        assert Agents._read_from_json(temp_path) == f"task {i}"
+
+    # Outside a task the configured path is used as is
+    assert Agents._temp_path("TEMP_FAIL_CASES.json") == "TEMP_FAIL_CASES.json"
+    with Agents.task_workspace("/tmp/some_task"):
+        assert Agents._temp_path("out/TEMP_FAIL_CASES.json") == "/tmp/some_task/TEMP_FAIL_CASES.json"
+
+
+def test_task_directory_is_removed_unless_kept(stub_agent, make_service):
+    service = make_service(workers=1)
+    service.start()
+    task = wait_for(service, service.submit("task")["task_id"])
+    assert not os.path.exists(os.path.dirname(task["result"]["temp_path"]))
+
+
+def test_full_queue_is_refused_with_503(stub_agent, make_service):
+    # No workers started: the first task stays queued and fills the queue
+    service = make_service(workers=1, max_queue=1)
+    AgentService.AgentRequestHandler.service = service
+    server = AgentService.ThreadingHTTPServer(("127.0.0.1", 0), AgentService.AgentRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/tasks",
+                                         data=json.dumps(body).encode("utf-8"), method="POST")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        status, body = post({"input": "first"})
+        assert status == 202
+        assert body["status"] == "queued"
+        assert post({"input": "second"})[0] == 503
+        assert post({"foo": 1})[0] == 400
+        # The refused task is not left behind
+        assert [task["task_id"] for task in service.list_tasks()] == [body["task_id"]]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_oldest_finished_tasks_are_forgotten(monkeypatch, make_service):
+    monkeypatch.setattr(AgentService, "MAX_FINISHED_TASKS", 2)
+    service = make_service()
+    for task_id, status, finished_at in [("a", "done", 3.0), ("b", "failed", 1.0), ("c", "running", None),
+                                         ("d", "done", 2.0), ("e", "queued", None)]:
+        service.tasks[task_id] = {"task_id": task_id, "status": status, "finished_at": finished_at}
+
+    service._forget_finished_tasks()
+    assert sorted(service.tasks) == ["a", "c", "d", "e"]
+    service._forget_finished_tasks()
+    assert sorted(service.tasks) == ["a", "c", "d", "e"]
@@ -0,0 +1,83 @@
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from TestCasePageFunctionExtractor import Extractor
+from TestCasePageFunctionExtractor.AstParser import parse_page_functions, parse_test_cases
+
+PAGE_FUNCTION_FILE = """import time
+
+class Main_Page():
+    @step('Click import')
+    def click_import(self, name, timeout=5):
+        time.sleep(1)
+        # done
+
+        return True
+
+@step('Module level')
+def helper(a):
+    pass
+"""
+
+TEST_CASE_FILE = """import pytest
+
+class Test_Media():
+    @pytest.mark.media
+    @pytest.mark.name('[test_a_1] Import')
+    def test_a_1(self):
+        '''
+        1. Open
+        2. Import
+        '''
+        with step('[Action] Open'):
+            main_page.open()
+        assert True
+
+    @pytest.mark.media
+    def test_a_2(self):
+        '''
+        1. Close
+        '''
+        assert True
+"""
+
+
+def make_extractor():
+    return Extractor.TestCase_PageFunction_Extractor(path_settings={
+        'page_functions_dir': None,
+        'test_case_dir': None,
+        'page_functions_json': None,
+        'test_case_json': None,
+    })
+
+
+def test_page_function_spans():
+    records = parse_page_functions(PAGE_FUNCTION_FILE, {"main_page": "main_page"})
+    assert [(record["name"], record["start_line"], record["end_line"]) for record in records] == [
+        ("main_page.click_import(name, timeout=5)", 4, 9),
+        ("UnknownClass.helper(a)", 11, 13),
+    ]
+    extractor = make_extractor()
+    extractor.class_mapping = {"main_page": "main_page"}
+    assert extractor._analyze_content_page_functions_regex(PAGE_FUNCTION_FILE) == records
+
+
+def test_test_case_spans():
+    records = parse_test_cases(TEST_CASE_FILE)
+    assert [(record["name"], record["start_line"], record["end_line"]) for record in records] == [
+        ("test_a_1", 4, 13),
+        ("test_a_2", 15, 20),
+    ]
+    lines = TEST_CASE_FILE.split("\n")
+    for record in records:
+        assert "\n".join(lines[record["start_line"] - 1:record["end_line"]]).strip() == record["full_code"]
+    assert make_extractor()._analyze_content_test_case_regex(TEST_CASE_FILE) == records
+
+
+def test_moved_records_are_not_reported_as_changed():
+    records = parse_test_cases(TEST_CASE_FILE)
+    moved = parse_test_cases("\n\n" + TEST_CASE_FILE)
+    assert moved[0]["start_line"] == records[0]["start_line"] + 2
+    assert make_extractor()._diff_records(records, moved) == {"added": [], "changed": [], "removed": []}
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import types
+import pytest
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from _ChatAPIConnector.ChatAPIConnector import ChatAPIConnector
+
+
+class TransientError(Exception):
+    pass
+
+
+class StubAsyncClient():
+    """Stands in for openai.AsyncOpenAI: echoes the prompt back, optionally failing the first attempts."""
+    def __init__(self, failures=0, error=TransientError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise self.error("try again")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        content = f"reply to {messages[1]['content']}"
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+def make_connector(async_client=None, **kwargs):
+    kwargs.setdefault("retryable_errors", (TransientError,))
+    return ChatAPIConnector(cache=None, client=object(), async_client=async_client or StubAsyncClient(),
+                            backoff_seconds=0, **kwargs)
+
+
+def test_map_chat_responses_keeps_prompt_order():
+    prompts = [f"prompt {i}" for i in range(10)]
+    assert make_connector().map_chat_responses(prompts, "system", max_concurrency=3) == [f"reply to {p}" for p in prompts]
+
+
+def test_amap_chat_responses_bounds_requests_in_flight():
+    client = StubAsyncClient()
+    connector = make_connector(client)
+    results = asyncio.run(connector.amap_chat_responses([f"p{i}" for i in range(12)], "system", max_concurrency=4))
+    assert len(results) == 12
+    assert client.max_in_flight == 4
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    client = StubAsyncClient(failures=2)
+    assert asyncio.run(make_connector(client, max_retries=2).agenerate_chat_response("p", "system")) == "reply to p"
+    assert client.calls == 3
+
+
+def test_retries_give_up_after_max_retries():
+    client = StubAsyncClient(failures=5)
+    with pytest.raises(TransientError):
+        asyncio.run(make_connector(client, max_retries=2).agenerate_chat_response("p", "system"))
+    assert client.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    client = StubAsyncClient(failures=1, error=KeyError)
+    with pytest.raises(KeyError):
+        asyncio.run(make_connector(client).agenerate_chat_response("p", "system"))
+    assert client.calls == 1
+
+
+def test_return_exceptions_keeps_failed_prompts_in_place():
+    client = StubAsyncClient(failures=1, error=KeyError)
+    results = make_connector(client).map_chat_responses(["a", "b"], "system", max_concurrency=1, return_exceptions=True)
+    assert isinstance(results[0], KeyError)
+    assert results[1] == "reply to b"
+
+
+def test_map_chat_responses_rejects_mismatched_image_paths():
+    with pytest.raises(ValueError, match="2 image paths for 3 prompts"):
+        make_connector().map_chat_responses(["a", "b", "c"], "system", image_paths=[None, None])
+
+
+def test_map_chat_responses_inside_a_running_loop_points_to_the_async_api():
+    connector = make_connector()
+
+    async def caller():
+        with pytest.raises(RuntimeError, match="amap_chat_responses"):
+            connector.map_chat_responses(["a"], "system")
+        return await connector.amap_chat_responses(["a"], "system")
+
+    assert asyncio.run(caller()) == ["reply to a"]
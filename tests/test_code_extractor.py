@@ -0,0 +1,87 @@
+import os
+import sys
+import random
+import pytest
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from _ChatAPIConnector.CodeExtractor import FencedCodeExtractor, extract_fenced_code
+
+CODE = "@pytest.mark.smoke\ndef test_login(self):\n    main_page.open()\n"
+RESPONSE = f"Here is the test:\n```python\n{CODE}```\nIt opens the main page."
+
+
+def split_at(text, *positions):
+    bounds = [0, *positions, len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def test_whole_response_in_one_chunk():
+    assert extract_fenced_code([RESPONSE]) == CODE
+
+
+@pytest.mark.parametrize("fence", ["opening", "closing"])
+def test_fence_split_across_chunks(fence):
+    start = RESPONSE.index("```") if fence == "opening" else RESPONSE.index("```", RESPONSE.index(CODE))
+    for offset in (1, 2):
+        assert extract_fenced_code(split_at(RESPONSE, start + offset)) == CODE
+        assert extract_fenced_code(split_at(RESPONSE, start + offset - 1, start + offset, start + offset + 1)) == CODE
+
+
+def test_language_tag_split_across_chunks():
+    tag = RESPONSE.index("python")
+    assert extract_fenced_code(split_at(RESPONSE, tag + 2, tag + 4)) == CODE
+
+
+def test_any_chunking_gives_the_same_code():
+    rng = random.Random(0)
+    for _ in range(200):
+        positions = sorted(rng.sample(range(1, len(RESPONSE)), rng.randint(1, 20)))
+        assert extract_fenced_code(split_at(RESPONSE, *positions)) == CODE
+    assert extract_fenced_code(list(RESPONSE)) == CODE
+
+
+def test_reading_stops_at_the_closing_fence():
+    consumed = []
+
+    def chunks():
+        for chunk in list(RESPONSE):
+            consumed.append(chunk)
+            yield chunk
+
+    assert extract_fenced_code(chunks()) == CODE
+    assert "".join(consumed) == RESPONSE[:RESPONSE.index(CODE) + len(CODE) + 3]
+
+
+def test_unterminated_final_fence():
+    with pytest.raises(ValueError, match="not closed"):
+        extract_fenced_code(split_at(f"```python\n{CODE}``", 5, 20))
+    with pytest.raises(ValueError, match="No code block"):
+        extract_fenced_code(["just prose, ", "no code"])
+
+
+def test_inline_backticks_are_not_fences():
+    code = 'def test_markdown(self):\n    assert render("```") == "<pre></pre>"\n'
+    response = f"Use a ``` block as below:\n```python\n{code}```\n"
+    assert extract_fenced_code([response]) == code
+    # Also when the inline backticks arrive one chunk at a time
+    assert extract_fenced_code(list(response)) == code
+
+
+def test_indented_fence_is_a_fence():
+    assert extract_fenced_code([f"1. The test:\n   ```python\n{CODE}   ```\n"]) == CODE + "   "
+
+
+def test_rejected_blocks_are_skipped():
+    response = f"First the page function:\n```python\ndef open(self):\n    pass\n```\nThen the test:\n```python\n{CODE}```"
+    assert extract_fenced_code([response], accept=lambda block: "@pytest" in block) == CODE
+    assert extract_fenced_code(list(response), accept=lambda block: "@pytest" in block) == CODE
+    with pytest.raises(ValueError, match="None of the 2 code block"):
+        extract_fenced_code([response], accept=lambda block: False)
+
+
+def test_gives_up_on_a_long_preamble():
+    extractor = FencedCodeExtractor(max_preamble_chars=10)
+    assert extractor.feed("0123456789") is False
+    with pytest.raises(ValueError, match="first 10 characters"):
+        extractor.feed("a")
@@ -0,0 +1,73 @@
+import os
+import sys
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+# Imported as a module: pytest would try to collect the Test* class from this namespace
+from TestCasePageFunctionExtractor import Extractor
+
+PAGE_FUNCTION_FILE = '''
+class MainPage():
+    @step('Open the app')
+    def open(self, timeout=5):
+        pass
+
+class Helper():
+    @step('Wait a bit')
+    def wait(self):
+        pass
+'''
+
+
+def make_extractor(tmp_path, class_mapping):
+    page_functions_dir = tmp_path / "page_functions"
+    page_functions_dir.mkdir(exist_ok=True)
+    (page_functions_dir / "main_page.py").write_text(PAGE_FUNCTION_FILE, encoding="utf-8")
+    extractor = Extractor.TestCase_PageFunction_Extractor(path_settings={
+        'page_functions_dir': str(page_functions_dir),
+        'test_case_dir': None,
+        'page_functions_json': str(tmp_path / "page_functions.json"),
+        'test_case_json': str(tmp_path / "test_cases_code.json"),
+    })
+    extractor.class_mapping = class_mapping
+    reparsed = []
+    analyze_files = extractor._analyze_files
+
+    def counting_analyze_files(file_paths, file_type, max_workers=1):
+        reparsed.extend(file_paths)
+        return analyze_files(file_paths, file_type, max_workers)
+
+    extractor._analyze_files = counting_analyze_files
+    return extractor, reparsed
+
+
+def test_unchanged_files_come_from_the_cache(tmp_path):
+    extractor, reparsed = make_extractor(tmp_path, {"mainpage": "main_page"})
+    records = extractor.extract_process('page_function')
+    assert [record["name"] for record in records] == ["main_page.open(timeout=5)", "helper.wait()"]
+    assert len(reparsed) == 1
+
+    extractor, reparsed = make_extractor(tmp_path, {"mainpage": "main_page"})
+    assert extractor.extract_process('page_function') == records
+    assert reparsed == []
+    assert extractor.changes['page_function'] == {"added": [], "changed": [], "removed": []}
+
+
+def test_changed_class_mapping_reparses_cached_files(tmp_path):
+    extractor, _ = make_extractor(tmp_path, {"mainpage": "main_page"})
+    extractor.extract_process('page_function')
+
+    extractor, reparsed = make_extractor(tmp_path, {"mainpage": "home_page"})
+    records = extractor.extract_process('page_function')
+    assert len(reparsed) == 1
+    assert [record["name"] for record in records] == ["home_page.open(timeout=5)", "helper.wait()"]
+    assert extractor.changes['page_function'] == {
+        "added": ["home_page.open(timeout=5)"],
+        "changed": [],
+        "removed": ["main_page.open(timeout=5)"],
+    }
+
+    # The new mapping is cached in turn
+    extractor, reparsed = make_extractor(tmp_path, {"mainpage": "home_page"})
+    extractor.extract_process('page_function')
+    assert reparsed == []
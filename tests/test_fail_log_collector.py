@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from FailLogCollector.FailLogCollector import FailLogCollector
+
+
+def start_line(test_name):
+    return f"Start TestItem: request_body={{'name': '[{test_name}] Some title', 'start_time': '1'}}\n"
+
+
+def finish_line(status):
+    return f"Finish TestItem: request_body={{'end_time': '2', 'status': '{status}'}}\n"
+
+
+def append(log_path, text):
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def make_collector(tmp_path, text=""):
+    log_path = tmp_path / "pytest.log"
+    log_path.write_text(text, encoding="utf-8")
+    return FailLogCollector({"log_path": str(log_path)}, verbose=False), str(log_path)
+
+
+def test_poll_waits_for_the_rest_of_a_partial_line(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, start_line("test_a") + "click button\n" + "Finish TestItem: request_bo")
+    assert collector.poll() == []
+
+    append(log_path, "dy={'end_time': '2', 'status': 'FAILED'}\n")
+    assert collector.poll() == [{"test_name": "test_a", "test_result": "FAIL", "test_log": ["click button"]}]
+    assert collector.tail_offset == os.path.getsize(log_path)
+
+
+def test_poll_emits_each_test_once_its_finish_line_arrives(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+
+    append(log_path, start_line("test_a") + "step 1\n")
+    assert collector.poll() == []
+
+    append(log_path, "step 2\n" + finish_line("PASSED") + start_line("test_b"))
+    assert collector.poll() == [{"test_name": "test_a", "test_result": "PASS", "test_log": ["step 1", "step 2"]}]
+
+    append(log_path, "boom\n")
+    assert collector.poll() == []
+
+    append(log_path, finish_line("FAILED") + start_line("test_c") + finish_line("SKIPPED"))
+    assert [(item["test_name"], item["test_result"]) for item in collector.poll()] == [("test_b", "FAIL"), ("test_c", "SKIP")]
+
+    # Nothing appended: nothing new
+    assert collector.poll() == []
+
+
+def test_poll_only_failures(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, start_line("test_a") + finish_line("PASSED") + start_line("test_b") + "boom\n" + finish_line("FAILED"))
+    assert collector.poll(only_failures=True) == [{"test_name": "test_b", "test_result": "FAIL", "test_log": ["boom"]}]
+
+
+def test_poll_restarts_after_truncation(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, start_line("test_a") + "first run\n" + finish_line("FAILED") + start_line("test_open") + "still running\n")
+    assert [item["test_name"] for item in collector.poll()] == ["test_a"]
+
+    # A new pytest run rewrites the log with a shorter file; the open test of the old run is forgotten
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write(start_line("test_b") + finish_line("FAILED"))
+    assert collector.poll() == [{"test_name": "test_b", "test_result": "FAIL", "test_log": []}]
+
+    append(log_path, start_line("test_c") + finish_line("PASSED"))
+    assert [item["test_name"] for item in collector.poll()] == ["test_c"]
+
+
+def test_poll_restarts_when_a_longer_log_replaces_the_old_one(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, start_line("test_a") + finish_line("FAILED"))
+    assert [item["test_name"] for item in collector.poll()] == ["test_a"]
+
+    # Rotated: a new file (new inode) that is already past the old offset when polled
+    new_log_path = str(tmp_path / "pytest.log.new")
+    with open(new_log_path, "w", encoding="utf-8") as f:
+        f.write(start_line("test_b") + "a long log line\n" * 20 + finish_line("FAILED") + start_line("test_c") + finish_line("PASSED"))
+    os.replace(new_log_path, log_path)
+    assert [item["test_name"] for item in collector.poll()] == ["test_b", "test_c"]
+    assert collector.poll() == []
+
+
+def test_poll_restarts_when_the_log_is_rewritten_in_place(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, start_line("test_a") + finish_line("FAILED"))
+    assert [item["test_name"] for item in collector.poll()] == ["test_a"]
+
+    # Same inode, longer content, different first line
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write(start_line("test_b") + "step\n" * 20 + finish_line("FAILED"))
+    assert collector.poll() == [{"test_name": "test_b", "test_result": "FAIL", "test_log": ["step"] * 20}]
+
+
+def test_poll_keeps_reading_a_first_line_written_in_pieces(tmp_path):
+    collector, log_path = make_collector(tmp_path)
+    append(log_path, "Start TestItem: request_bo")
+    assert collector.poll() == []
+    append(log_path, start_line("test_a")[len("Start TestItem: request_bo"):] + finish_line("FAILED"))
+    assert [item["test_name"] for item in collector.poll()] == ["test_a"]
+
+
+def test_follow_drains_the_log_once_stopped(tmp_path):
+    collector, log_path = make_collector(tmp_path, start_line("test_a") + finish_line("FAILED"))
+    append(log_path, start_line("test_b") + finish_line("PASSED") + start_line("test_c") + finish_line("FAILED"))
+    stop_event = threading.Event()
+    stop_event.set()
+    assert [item["test_name"] for item in collector.follow(poll_interval=0, stop_event=stop_event)] == ["test_a", "test_c"]
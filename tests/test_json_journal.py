@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from _BasicTool.JsonJournal import JsonJournal, atomic_write
+
+
+def make_journal(tmp_path, records, compact_every=50):
+    json_path = str(tmp_path / "test_cases.json")
+    atomic_write(json_path, json.dumps(records))
+    return JsonJournal(json_path, compact_every=compact_every)
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_upserts_are_replayed_over_the_json(tmp_path):
+    journal = make_journal(tmp_path, [{"name": "a", "code": 1}, {"name": "b", "code": 1}])
+    journal.upsert({"name": "b", "code": 2})
+    journal.upsert_many([{"name": "c", "code": 1}, {"name": "a", "code": 3}])
+    journal.upsert({"name": "c", "code": 4})
+
+    # The JSON itself is untouched until compaction
+    assert read_json(journal.json_path) == [{"name": "a", "code": 1}, {"name": "b", "code": 1}]
+    expected = [{"name": "a", "code": 3}, {"name": "b", "code": 2}, {"name": "c", "code": 4}]
+    assert journal.load() == expected
+    assert JsonJournal(journal.json_path).load() == expected
+
+
+def test_journal_is_compacted_into_the_json(tmp_path):
+    journal = make_journal(tmp_path, [{"name": "a", "code": 1}], compact_every=3)
+    journal.upsert({"name": "b", "code": 1})
+    journal.upsert({"name": "a", "code": 2})
+    assert os.path.exists(journal.journal_path)
+
+    # Another writer's upsert lands in the same journal and must survive our compaction
+    JsonJournal(journal.json_path).upsert({"name": "other", "code": 1})
+    journal.upsert({"name": "c", "code": 1})
+    expected = [{"name": "a", "code": 2}, {"name": "b", "code": 1}, {"name": "other", "code": 1}, {"name": "c", "code": 1}]
+    assert not os.path.exists(journal.journal_path)
+    assert read_json(journal.json_path) == expected
+    assert journal.load() == expected
+    # Written through a temp file that is renamed over the JSON, nothing left behind
+    assert sorted(os.listdir(tmp_path)) == ["test_cases.json"]
+
+
+def test_signature_changes_with_the_json_and_the_journal(tmp_path):
+    journal = make_journal(tmp_path, [{"name": "a"}])
+    signature = journal.signature()
+    assert signature[1] is None
+    assert journal.signature() == signature
+
+    journal.upsert({"name": "b"})
+    assert journal.signature() != signature
+    signature = journal.signature()
+    journal.compact(journal.load())
+    assert journal.signature() != signature
+    assert journal.signature()[1] is None
+
+
+def test_truncated_last_line_is_skipped_and_the_next_append_starts_a_new_line(tmp_path):
+    journal = make_journal(tmp_path, [{"name": "a", "code": 1}])
+    journal.upsert({"name": "b", "code": 1})
+    # An append interrupted mid-record
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"name": "a", "co')
+    assert journal.load() == [{"name": "a", "code": 1}, {"name": "b", "code": 1}]
+
+    journal.upsert({"name": "c", "code": 1})
+    assert journal.load() == [{"name": "a", "code": 1}, {"name": "b", "code": 1}, {"name": "c", "code": 1}]
+    with open(journal.journal_path, "r", encoding="utf-8") as f:
+        assert f.read().splitlines()[-1] == '{"name": "c", "code": 1}'
@@ -0,0 +1,139 @@
+import os
+import sys
+import pytest
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+import _BasicTool.PromptBuilder as prompt_builder_module
+from _BasicTool.PromptBuilder import PromptBuilder, count_tokens, trim_code_to_steps
+
+MODEL = "stub-model"
+
+
+class WordEncoding():
+    """Stands in for a tiktoken encoding: one token per whitespace separated word."""
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture
+def without_tiktoken(monkeypatch):
+    # As if tiktoken were not installed: CHARS_PER_TOKEN characters per token
+    monkeypatch.setitem(prompt_builder_module._encodings, MODEL, None)
+
+
+@pytest.fixture
+def word_encoding(monkeypatch):
+    monkeypatch.setitem(prompt_builder_module._encodings, MODEL, WordEncoding())
+
+
+def make_builder(token_budget):
+    return PromptBuilder(token_budget=token_budget, model=MODEL, verbose=False)
+
+
+def text_section(name, items, **kwargs):
+    return dict(name=name, items=items, render=lambda item: item, **kwargs)
+
+
+def test_fallback_counts_characters(without_tiktoken):
+    assert count_tokens("", MODEL) == 0
+    assert count_tokens("abcd", MODEL) == 1
+    assert count_tokens("abcde", MODEL) == 2
+
+
+def test_tiktoken_counts_are_used_when_available(word_encoding):
+    assert count_tokens("open the settings page", MODEL) == 4
+    builder = make_builder(token_budget=10)
+    # 2 words + 1 separator each: three items fit
+    packed = builder.pack([text_section("steps", ["a b", "c d", "e f", "g h"])])
+    assert packed == {"steps": ["a b", "c d", "e f"]}
+
+
+def test_real_tiktoken_encoding():
+    tiktoken = pytest.importorskip("tiktoken")
+    text = "def test_login(self):\n    main_page.open()"
+    assert count_tokens(text) == len(tiktoken.encoding_for_model("gpt-4o").encode(text))
+
+
+def test_sections_share_the_budget(without_tiktoken):
+    builder = make_builder(token_budget=20)
+    # 8 characters: 2 tokens + 1 separator; 16 characters: 4 tokens + 1 separator
+    small = [c * 8 for c in "abcd"]
+    large = [c * 16 for c in "wxyz"]
+    packed = builder.pack([text_section("small", small), text_section("large", large)])
+    assert packed == {"small": small[:3], "large": large[:2]}
+    assert builder.last_report["sections"] == {
+        "small": {"packed_items": 3, "packed_tokens": 9, "dropped_items": 1, "dropped_tokens": 3},
+        "large": {"packed_items": 2, "packed_tokens": 10, "dropped_items": 2, "dropped_tokens": 10},
+    }
+    assert builder.last_report["total_tokens"] == 19
+
+
+def test_leftover_tokens_go_to_dropped_items(without_tiktoken):
+    builder = make_builder(token_budget=20)
+    items = [c * 8 for c in "abcde"]
+    # The first pass only gives "steps" half the budget; the unused half of "empty" takes the rest
+    assert builder.pack([text_section("steps", items), text_section("empty", [])]) == {"steps": items, "empty": []}
+
+
+def test_scores_decide_what_is_kept_and_the_order(without_tiktoken):
+    builder = make_builder(token_budget=5)
+    items = ["low_", "high", "mid_"]
+    packed = builder.pack([text_section("functions", items, scores=[0.1, 0.9, 0.5])])
+    assert packed == {"functions": ["high", "mid_"]}
+
+
+def test_duplicates_are_packed_once(without_tiktoken):
+    builder = make_builder(token_budget=100)
+    packed = builder.pack([text_section("cases", ["same", "other", "same"])])
+    assert packed == {"cases": ["same", "other"]}
+    assert builder.last_report["sections"]["cases"]["dropped_items"] == 0
+
+
+def test_fixed_text_over_budget_packs_nothing(without_tiktoken):
+    builder = make_builder(token_budget=10)
+    packed = builder.pack([text_section("cases", ["a"]), {"name": "none", "items": None}], fixed_text="x" * 80)
+    assert packed == {"cases": [], "none": []}
+    assert builder.last_report["fixed_tokens"] == 20
+
+
+def test_items_larger_than_the_budget_are_dropped(without_tiktoken):
+    builder = make_builder(token_budget=10)
+    packed = builder.pack([text_section("cases", ["x" * 100, "ok"])])
+    assert packed == {"cases": ["ok"]}
+
+
+TEST_CODE = '''@pytest.mark.smoke
+def test_export(self):
+    """Export a report."""
+    setup()
+    with step('Open the report page'):
+        report_page.open()
+    with step('Select last month'):
+        report_page.select_month()
+    with step('Print a copy'):
+        report_page.print()
+    with step('Export report as PDF'):
+        report_page.export('pdf')
+    teardown()'''
+
+
+def test_trim_code_keeps_relevant_step_blocks():
+    trimmed = trim_code_to_steps(TEST_CODE, ["Open report page", "Export as PDF"])
+    assert trimmed == '''@pytest.mark.smoke
+def test_export(self):
+    """Export a report."""
+    setup()
+    with step('Open the report page'):
+        report_page.open()
+    # ...
+    with step('Export report as PDF'):
+        report_page.export('pdf')
+    teardown()'''
+
+
+def test_trim_code_without_matches_keeps_the_first_step():
+    trimmed = trim_code_to_steps(TEST_CODE, ["Delete user"])
+    assert "with step('Open the report page')" in trimmed
+    assert trimmed.count("# ...") == 1
+    assert trim_code_to_steps("def test_a():\n    pass", ["anything"]) == "def test_a():\n    pass"
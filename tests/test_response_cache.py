@@ -0,0 +1,107 @@
+import os
+import sys
+import types
+import pytest
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+import _ChatAPIConnector.ResponseCache as response_cache_module
+from _ChatAPIConnector.ChatAPIConnector import ChatAPIConnector
+from _ChatAPIConnector.ResponseCache import ResponseCache
+
+
+class StubClient():
+    """Stands in for openai.OpenAI: answers every request locally and counts them."""
+    def __init__(self):
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        content = f"reply {self.calls} to {messages[-1]['content']}"
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+class Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache_module, "time", clock)
+    return clock
+
+
+def make_connector(**cache_kwargs):
+    client = StubClient()
+    return ChatAPIConnector(cache=ResponseCache(":memory:", **cache_kwargs), client=client), client
+
+
+def test_identical_requests_hit_the_cache(clock):
+    connector, client = make_connector()
+    first = connector.generate_chat_response("prompt", "system")
+    assert connector.generate_chat_response("prompt", "system") == first
+    assert client.calls == 1
+    assert connector.cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+    # Any part of the key differing is a miss
+    connector.generate_chat_response("prompt", "other system")
+    connector.generate_chat_response("prompt", "system", model="gpt-4o-mini")
+    connector.generate_chat_response("other prompt", "system")
+    assert client.calls == 4
+
+    # use_cache=False always asks the client and stores nothing
+    connector.generate_chat_response("prompt", "system", use_cache=False)
+    assert client.calls == 5
+    assert connector.cache.stats()["entries"] == 4
+
+
+def test_entries_expire_after_ttl(clock):
+    connector, client = make_connector(ttl_seconds=60)
+    connector.generate_chat_response("prompt", "system")
+
+    clock.now += 60
+    connector.generate_chat_response("prompt", "system")
+    assert client.calls == 1
+
+    clock.now += 1
+    connector.generate_chat_response("prompt", "system")
+    assert client.calls == 2
+    assert connector.cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    connector, client = make_connector(max_entries=2)
+    for prompt in ("a", "b"):
+        connector.generate_chat_response(prompt, "system")
+        clock.now += 1
+
+    # Reading "a" makes "b" the least recently used entry
+    connector.generate_chat_response("a", "system")
+    clock.now += 1
+    connector.generate_chat_response("c", "system")
+    assert client.calls == 3
+    assert connector.cache.stats()["entries"] == 2
+
+    clock.now += 1
+    connector.generate_chat_response("a", "system")
+    connector.generate_chat_response("c", "system")
+    assert client.calls == 3
+    connector.generate_chat_response("b", "system")
+    assert client.calls == 4
+
+
+def test_injected_client_does_not_read_app_config(monkeypatch):
+    def fail():
+        raise AssertionError("app.config should not be read")
+
+    monkeypatch.setattr(ChatAPIConnector, "_read_config", lambda self: fail())
+    connector = ChatAPIConnector(client=StubClient())
+    assert connector.config is None
+    assert connector.cache is None
+    assert connector.generate_chat_response("prompt", "system") == "reply 1 to prompt"
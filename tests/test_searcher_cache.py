@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import threading
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from _BasicTool.JsonJournal import JsonJournal
+from _BasicTool.Searcher import load_searcher
+
+
+class StubSearcher():
+    """Stands in for a SearchBase subclass: records each construction instead of building a FAISS index."""
+    built = []
+
+    def __init__(self, json_path, faiss_path, top_k=5):
+        with open(json_path, "r", encoding="utf-8") as f:
+            self.data = json.load(f)
+        self.top_k = top_k
+        threading.Event().wait(0.05)
+        StubSearcher.built.append(self)
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_searcher_is_shared_until_its_json_changes(tmp_path):
+    StubSearcher.built = []
+    json_path, faiss_path = str(tmp_path / "page_functions.json"), str(tmp_path / "page_functions.faiss")
+    write_json(json_path, [{"name": "a"}])
+
+    searcher = load_searcher(StubSearcher, json_path, faiss_path)
+    assert load_searcher(StubSearcher, json_path, faiss_path) is searcher
+    # Other options are another searcher
+    assert load_searcher(StubSearcher, json_path, faiss_path, top_k=10) is not searcher
+    assert len(StubSearcher.built) == 2
+
+    write_json(json_path, [{"name": "a"}, {"name": "b"}])
+    rebuilt = load_searcher(StubSearcher, json_path, faiss_path)
+    assert rebuilt is not searcher
+    assert rebuilt.data == [{"name": "a"}, {"name": "b"}]
+    assert load_searcher(StubSearcher, json_path, faiss_path) is rebuilt
+
+    # A journaled upsert changes the signature too
+    JsonJournal(json_path).upsert({"name": "c"})
+    assert load_searcher(StubSearcher, json_path, faiss_path) is not rebuilt
+    assert len(StubSearcher.built) == 4
+
+
+def test_concurrent_callers_build_the_searcher_once(tmp_path):
+    StubSearcher.built = []
+    json_path, faiss_path = str(tmp_path / "test_cases.json"), str(tmp_path / "test_cases.faiss")
+    write_json(json_path, [{"name": "a"}])
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load_searcher(StubSearcher, json_path, faiss_path)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(StubSearcher.built) == 1
+    assert all(result is StubSearcher.built[0] for result in results)
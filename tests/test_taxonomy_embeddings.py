@@ -0,0 +1,63 @@
+import os
+import sys
+import numpy as np
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_path)
+
+from ErrorAnalyzer.Analyzer_v2 import ErrorAnalyzer
+
+
+class StubModel():
+    """Stands in for SentenceTransformer: one deterministic unit vector per text, counting encode calls."""
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        self.encoded += 1
+        vectors = np.array([[len(text), sum(map(ord, text)) % 97, 1.0] for text in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_analyzer(tmp_path, fail_reasons=None):
+    # Skips __init__, which loads the real model and the test case corpus
+    analyzer = ErrorAnalyzer.__new__(ErrorAnalyzer)
+    analyzer.fail_reasons = fail_reasons or {"UI": {"Button": {"Button missing": [], "Button disabled": []}}}
+    analyzer.model_name = "stub"
+    analyzer.model = StubModel()
+    analyzer.taxonomy_embeddings_path = str(tmp_path / "fail_reason_embeddings.npz")
+    analyzer._taxonomy_embeddings = None
+    return analyzer
+
+
+def test_embeddings_are_encoded_once_and_kept_on_the_instance(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    conditions, condition_embeddings, _ = analyzer._get_taxonomy_embeddings()
+    assert conditions == ["Button missing", "Button disabled"]
+    assert analyzer.model.encoded == 2
+    assert os.listdir(tmp_path) == ["fail_reason_embeddings.npz"]
+
+    assert analyzer._get_taxonomy_embeddings()[1] is condition_embeddings
+    assert analyzer.model.encoded == 2
+
+    # A new instance loads the npz instead of encoding
+    other = make_analyzer(tmp_path)
+    np.testing.assert_array_equal(other._get_taxonomy_embeddings()[1], condition_embeddings)
+    assert other.model.encoded == 0
+
+
+def test_changed_taxonomy_is_re_encoded(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    analyzer._get_taxonomy_embeddings()
+    analyzer.fail_reasons = {"UI": {"Button": {"Button missing": [], "Popup shown": []}}}
+    conditions, condition_embeddings, _ = analyzer._get_taxonomy_embeddings()
+    assert conditions == ["Button missing", "Popup shown"]
+    assert condition_embeddings.shape == (2, 3)
+    assert analyzer.model.encoded == 4
+
+
+def test_unreadable_npz_is_re_encoded(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    (tmp_path / "fail_reason_embeddings.npz").write_bytes(b"PK\x03\x04 truncated")
+    assert len(analyzer._get_taxonomy_embeddings()[0]) == 2
+    assert analyzer.model.encoded == 2
+    assert len(make_analyzer(tmp_path)._get_taxonomy_embeddings()[0]) == 2